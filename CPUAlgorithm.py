@@ -1,5 +1,130 @@
 import math
-from opening_book import BOOK
+import os
+import time
+
+import tt_snapshot
+from board import mirror_bitboard
+from book_format import NO_MOVE, load_book
+
+
+# binary books loaded from next to this file, later files override earlier ones
+# (deep_book.bin is what generate_book.py writes by default)
+BOOK_FILES = ("opening_book.bin", "deep_book.bin")
+
+
+def load_default_book():
+    """
+    Loads the binary books in BOOK_FILES that exist next to this file.
+    Without opening_book.bin the generated opening_book.py dict is used as the base.
+    Entries are (x_board, o_board) -> (value, best_move, distance), x = side to move.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    book = {}
+
+    if not os.path.exists(os.path.join(here, BOOK_FILES[0])):
+        from opening_book import BOOK as LEGACY_BOOK
+        book = {k: (v, NO_MOVE, 0) for k, v in LEGACY_BOOK.items()}
+
+    for name in BOOK_FILES:
+        path = os.path.join(here, name)
+        if os.path.exists(path):
+            book.update(load_book(path))
+    return book
+
+
+BOOK = load_default_book()
+# plies that have at least one book entry, checked before hashing anything
+BOOK_PLIES = frozenset((x | o).bit_count() for x, o in BOOK)
+
+
+class SearchAborted(Exception):
+    """Raised inside negamax when a search runs past its time or node limit, or is stopped."""
+    pass
+
+
+class SearchStats:
+    """
+    What one search (or, merged, many searches) cost. Opt-in: pass one to
+    MinMax.search(stats=...) and it is filled in; without it negamax only
+    pays a None check per node.
+    """
+    FIELDS = ("searches", "nodes", "depth", "tt_probes", "tt_hits", "tt_cutoffs", "tt_stores",
+              "cutoffs", "first_move_cutoffs", "seconds")
+
+    def __init__(self):
+        self.searches = 0
+        self.nodes = 0
+        self.depth = 0  # deepest fully searched iteration
+        self.tt_probes = 0
+        self.tt_hits = 0  # probes that found an entry
+        self.tt_cutoffs = 0  # hits that answered the node without searching it
+        self.tt_stores = 0
+        self.cutoffs = 0  # beta cutoffs
+        self.first_move_cutoffs = 0  # beta cutoffs on the first move tried
+        self.seconds = 0.0
+        self.source = None  # "book", "win", "block", "search" or "analyze" for a single search
+
+    @property
+    def nps(self):
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def merge(self, other):
+        for name in self.FIELDS:
+            if name == "depth":
+                self.depth = max(self.depth, other.depth)
+            else:
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def as_dict(self):
+        out = {name: getattr(self, name) for name in self.FIELDS}
+        out["seconds"] = round(self.seconds, 4)
+        out["nps"] = round(self.nps)
+        out["tt_hit_rate"] = round(self.tt_hit_rate, 4)
+        out["first_move_cutoff_rate"] = round(self.first_move_cutoff_rate, 4)
+        if self.source is not None:
+            out["source"] = self.source
+        return out
+
+    def __str__(self):
+        if self.source in ("book", "win", "block"):
+            return f"{self.source}: no search ({self.seconds * 1000:.2f} ms)"
+        return (f"{self.source or 'search'}: depth {self.depth}, {self.nodes} nodes in {self.seconds:.3f}s "
+                f"({self.nps:,.0f} nps), TT {self.tt_hits}/{self.tt_probes} hits ({self.tt_hit_rate:.1%}), "
+                f"{self.tt_stores} stores, {self.cutoffs} cutoffs ({self.first_move_cutoff_rate:.1%} on the first move)")
+
+
+class SearchControl:
+    """
+    Per-search limits, passed down through negamax instead of living on the MinMax,
+    so one engine can run searches for several threads at once.
+    """
+    CHECK_EVERY = 1024  # nodes between clock / stop checks
+
+    def __init__(self, time_limit=None, node_limit=None, use_book=True, stats=None, stop=None):
+        self.deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self.node_limit = node_limit
+        self.use_book = use_book
+        self.stats = stats
+        self.stop = stop  # threading.Event another thread sets to end the search
+        self.nodes = 0
+
+    def tick(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchAborted()
+        if self.nodes % self.CHECK_EVERY == 0:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchAborted()
+            if self.stop is not None and self.stop.is_set():
+                raise SearchAborted()
 
 
 class MinMax:
@@ -9,7 +134,7 @@ class MinMax:
       - alpha-beta
       - transposition table
       - 'suicide move' filter
-      - opening book (play 8 positions in opening_book.py)
+      - opening book (opening_book.bin / deep_book.bin, or opening_book.py)
     """
 
     # TT flags
@@ -27,21 +152,49 @@ class MinMax:
     MATE_SCORE = 10_000_000 # largest score
     BOOK_SCORE = 5_000_000  # below mate score, above heuristic
 
+    # TT is cleared once it grows past this many entries
+    tt_max_entries = 2_000_000
+
+    # column order moves are tried in (after TT/previous-best moves): center first
+    move_order = (3, 2, 4, 1, 5, 0, 6)
+
     def __init__(self):
         # key -> (depth, flag, value, best_move)
         # value is stored in the negamax-return convention (score for side-to-move after sign),
         # which is made consistent by deriving sign from to_move.
         self.tt = {}
+        self.book_hits = 0  # root moves answered straight from the opening book
 
     def tt_key(self, board, to_move: int):
         # IMPORTANT: This assumes score sign is derived from to_move inside _negamax.
         return (board.cpu_board, board.player_board, to_move)
 
+    # ---------- TT snapshots ----------
+    def save_tt(self, path, exact_only=True):
+        """Writes the TT (only EXACT entries by default) to a snapshot file. Returns the entry count."""
+        return tt_snapshot.save(self.tt, path, self.EXACT if exact_only else None)
+
+    def load_tt(self, path):
+        """
+        Merges a snapshot into the TT, keeping whichever entry searched deeper.
+        Raises tt_snapshot.SnapshotError if the file is damaged or from another version.
+        """
+        loaded = tt_snapshot.load(path)
+        for key, entry in loaded.items():
+            cur = self.tt.get(key)
+            if cur is None or cur[0] < entry[0]:
+                self.tt[key] = entry
+        return len(loaded)
+
     # Opening book lookup
-    def book_lookup(self, board, to_move: int):
+    def book_entry(self, board, to_move: int):
+        """
+        Returns (value, best_move, distance) for the side to move, or None if the
+        position is not in the book. A mirrored hit has its best move mirrored back.
+        """
         moves_played = (board.cpu_board | board.player_board).bit_count()
-        # checks if it is move 8
-        if moves_played != 8:
+        # only plies the book actually covers
+        if moves_played not in BOOK_PLIES:
             return None
 
         # toggle for turn
@@ -52,63 +205,145 @@ class MinMax:
             x_board = board.player_board
             o_board = board.cpu_board
 
-        v = BOOK.get((x_board, o_board))
-        if v is not None:
-            return v
+        entry = BOOK.get((x_board, o_board))
+        if entry is not None:
+            return entry
 
         # Mirror fallback (Connect 4 is symmetric under horizontal reflection)
-        mx = self.mirror_bitboard(x_board)
-        mo = self.mirror_bitboard(o_board)
-        return BOOK.get((mx, mo))
-    
-    def mirror_bitboard(self, bb: int) -> int:
-        out = 0
-        for col in range(7):
-            mcol = 6 - col
-            for row in range(6):
-                bit = 1 << (col * 7 + row)
-                if bb & bit:
-                    out |= 1 << (mcol * 7 + row)
-        return out
+        mx = mirror_bitboard(x_board)
+        mo = mirror_bitboard(o_board)
+        entry = BOOK.get((mx, mo))
+        if entry is None:
+            return None
+        value, best_move, distance = entry
+        if best_move != NO_MOVE:
+            best_move = 6 - best_move
+        return value, best_move, distance
+
+    def book_lookup(self, board, to_move: int):
+        entry = self.book_entry(board, to_move)
+        return entry[0] if entry is not None else None
+
+    def book_move(self, board, valid_moves):
+        """
+        Book answer for the CPU at the root: (col, score) or None.
+        Uses the stored best move, otherwise looks one ply ahead into the book
+        (e.g. ply 8 entries answer ply 7 positions).
+        """
+        entry = self.book_entry(board, self.CPU)
+        if entry is not None and entry[1] in valid_moves:
+            return entry[1], entry[0] * self.BOOK_SCORE
+
+        moves_played = (board.cpu_board | board.player_board).bit_count()
+        if moves_played + 1 not in BOOK_PLIES:
+            return None
+
+        known = []
+        unknown = False
+        for col in [c for c in self.move_order if c in valid_moves]:
+            board.make_move(col, self.CPU)
+            if board.check_winner(self.CPU):
+                board.undo_move()
+                return col, self.MATE_SCORE
+            child = self.book_entry(board, self.PLAYER)
+            board.undo_move()
+
+            if child is None:
+                unknown = True
+            else:
+                known.append((-child[0], col))  # child value is from the player's side
+
+        if not known:
+            return None
+        # max keeps the first (most central) of equal values
+        value, col = max(known, key=lambda t: t[0])
+        # with replies missing from the book only a proven win is safe without searching
+        if unknown and value < 1:
+            return None
+        return col, value * self.BOOK_SCORE
 
     # ---------- game entry point ----------
-    def MinMaxCalculate(self, board):
+    def MinMaxCalculate(self, board, max_depth=None, time_limit=None, node_limit=None, use_book=True, stats=None):
+        return self.search(board, max_depth, time_limit, node_limit, use_book, stats)[0]
+
+    def search(self, board, max_depth=None, time_limit=None, node_limit=None, use_book=True, stats=None,
+               stop=None, on_depth=None):
+        """
+        Picks the CPU move for `board`.
+        Returns (col, score, depth) with score from the CPU's side; score is None
+        when the move was forced (an immediate block) and never searched.
+        depth is the depth the answer is good for: the full depth asked for
+        (max_depth / depth_max) unless a limit or stop cut the search short, in
+        which case it is the last depth that finished. Book, forced moves, proven
+        wins and searches that reach the end of the game count as full depth.
+
+        max_depth replaces depth_max for this search. time_limit (seconds) and
+        node_limit stop the search early and keep the best move of the last
+        finished depth. use_book=False plays without the opening book.
+        stats (a SearchStats) is filled in with what the search cost.
+        stop (a threading.Event) ends the search early from another thread, and
+        on_depth(depth, col, score, nodes) is called after every finished depth.
+        """
+        if stats is None:
+            return self._search(board, max_depth, time_limit, node_limit, use_book, None, stop, on_depth)
+
+        start = time.perf_counter()
+        try:
+            return self._search(board, max_depth, time_limit, node_limit, use_book, stats, stop, on_depth)
+        finally:
+            stats.searches += 1
+            stats.seconds += time.perf_counter() - start
+
+    def _search(self, board, max_depth, time_limit, node_limit, use_book, stats=None, stop=None, on_depth=None):
+        depth_limit = self.depth_max if max_depth is None else max(1, max_depth)
+
         moves_played = (board.cpu_board | board.player_board).bit_count()
         empties = 42 - moves_played
 
         # variable depth
         if moves_played < 8:
-            max_depth = 8 # opening: doesnt need to go past opening book
-        elif empties <= self.depth_max:
+            max_depth = min(8, depth_limit) # opening: doesnt need to go past opening book
+        elif empties <= depth_limit:
             max_depth = empties # endgame: doent need to extened past the end of the game
         else:
-            max_depth = self.depth_max # midmage: past opening book before endgame
+            max_depth = depth_limit # midmage: past opening book before endgame
 
         # TT size cap
-        if len(self.tt) > 2_000_000:
+        if len(self.tt) > self.tt_max_entries:
             self.tt.clear()
 
         # check for playable positions
         valid_moves = board.get_valid_moves()
         if not valid_moves:
-            return 0
+            return 0, 0, depth_limit
 
         '''
         Decision making starts here
 
         - Priority
-        1. Imediate win
-        2. Immediate block
-        3. Stored TT move
-        4. New Calculation
+        1. Opening book
+        2. Imediate win
+        3. Immediate block
+        4. Stored TT move
+        5. New Calculation
         '''
+        # Opening book: stored best move, no search at all
+        bm = self.book_move(board, valid_moves) if use_book else None
+        if bm is not None:
+            self.book_hits += 1
+            if stats is not None:
+                stats.source = "book"
+            return bm[0], bm[1], depth_limit
+
         # Immediate win
         for col in valid_moves:
             board.make_move(col, self.CPU)
             win = board.check_winner(self.CPU)
             board.undo_move()
             if win:
-                return col
+                if stats is not None:
+                    stats.source = "win"
+                return col, self.MATE_SCORE + max_depth, depth_limit
 
         # Immediate block
         for col in valid_moves:
@@ -116,10 +351,12 @@ class MinMax:
             opp_win = board.check_winner(self.PLAYER)
             board.undo_move()
             if opp_win:
-                return col
+                if stats is not None:
+                    stats.source = "block"
+                return col, None, depth_limit
 
         # Root move ordering baseline: center first
-        base_order = sorted(valid_moves, key=lambda c: abs(3 - c))
+        base_order = [c for c in self.move_order if c in valid_moves]
 
         # If TT already has a best move for the root, try it first
         root_key = self.tt_key(board, self.CPU)
@@ -133,6 +370,11 @@ class MinMax:
         # Iterative deepening: depth 1 to self.depth
         best_move = base_order[0]
         best_score = -math.inf
+        limited = (time_limit is not None or node_limit is not None or not use_book or stats is not None
+                   or stop is not None or on_depth is not None)
+        ctl = SearchControl(time_limit, node_limit, use_book, stats, stop) if limited else None
+        history_len = len(board.history)
+        reached = depth_limit  # lowered to the last finished depth if the search is cut short
 
         for d in range(1, max_depth + 1):
             alpha, beta = -math.inf, math.inf
@@ -145,41 +387,139 @@ class MinMax:
                 ordered.remove(cur_best_move)
                 ordered.insert(0, cur_best_move)
 
-            for col in ordered:
-                # make move, calculate score, undo move, repeat
-                board.make_move(col, self.CPU)
+            try:
+                for col in ordered:
+                    # make move, calculate score, undo move, repeat
+                    board.make_move(col, self.CPU)
 
-                # after CPU move, it's PLAYER to move; negate because negamax return is from side-to-move
-                score = -self.negamax(board, d - 1, -beta, -alpha, self.PLAYER)
+                    # after CPU move, it's PLAYER to move; negate because negamax return is from side-to-move
+                    score = -self.negamax(board, d - 1, -beta, -alpha, self.PLAYER, ctl)
 
-                board.undo_move()
+                    board.undo_move()
 
-                # check if move is better than stored best
-                if score > cur_best_score:
-                    cur_best_score = score
-                    cur_best_move = col
+                    # check if move is better than stored best
+                    if score > cur_best_score:
+                        cur_best_score = score
+                        cur_best_move = col
 
-                alpha = max(alpha, cur_best_score)
-                if alpha >= beta:
-                    break
+                    alpha = max(alpha, cur_best_score)
+                    if alpha >= beta:
+                        break
+            except SearchAborted:
+                # out of time/nodes: unwind the moves the aborted search left on the board
+                # and keep the last fully searched depth
+                while len(board.history) > history_len:
+                    board.undo_move()
+                reached = d - 1
+                break
 
             best_move = cur_best_move
             best_score = cur_best_score
+            if stats is not None:
+                stats.depth = d
+            if on_depth is not None:
+                on_depth(d, best_move, best_score, ctl.nodes)
 
             # Optional early exit: if we found a forced win at this depth, keep it
             if best_score >= self.MATE_SCORE - 1000:
                 break
 
-        return best_move
+        if stats is not None:
+            stats.source = "search"
+            stats.nodes += ctl.nodes
+        return best_move, best_score, reached
+
+    def analyze(self, board, max_depth=None, time_limit=None, node_limit=None, use_book=True, solve=False,
+                stats=None):
+        """
+        Scores every legal CPU move for `board` instead of just picking one.
+        Returns ({col: score}, depth): scores from the CPU's side on the same scale
+        as search(), from the deepest depth finished for every move.
+        Each move gets its own full-window search (so the scores are values, not
+        alpha-beta bounds), all sharing the TT, so later moves and deeper
+        iterations reuse what the earlier ones found.
+        solve=True searches to the end of the game, which makes the scores exact
+        (limits still apply, and it is only quick late in the game).
+        """
+        valid_moves = board.get_valid_moves()
+        if not valid_moves:
+            return {}, 0
+
+        empties = 42 - (board.cpu_board | board.player_board).bit_count()
+        depth_limit = empties if solve else min(empties, self.depth_max if max_depth is None else max(1, max_depth))
+
+        if len(self.tt) > self.tt_max_entries:
+            self.tt.clear()
+
+        ctl = SearchControl(time_limit, node_limit, use_book, stats)
+        history_len = len(board.history)
+        scores, depth = {}, 0
+        start = time.perf_counter()
+        try:
+            for d in range(1, depth_limit + 1):
+                cur = {}
+                for col in valid_moves:
+                    board.make_move(col, self.CPU)
+                    if board.check_winner(self.CPU):
+                        cur[col] = self.MATE_SCORE + d
+                    else:
+                        cur[col] = -self.negamax(board, d - 1, -math.inf, math.inf, self.PLAYER, ctl)
+                    board.undo_move()
+                scores, depth = cur, d
+                if stats is not None:
+                    stats.depth = d
+
+                # every move is already a known win or loss, deeper won't change anything
+                if all(abs(score) >= self.BOOK_SCORE - 1000 for score in cur.values()):
+                    break
+        except SearchAborted:
+            while len(board.history) > history_len:
+                board.undo_move()
+        finally:
+            if stats is not None:
+                stats.searches += 1
+                stats.seconds += time.perf_counter() - start
+                stats.nodes += ctl.nodes
+                stats.source = "analyze"
+        return scores, depth
+
+    def principal_variation(self, board, first_move, max_len=42):
+        """
+        Expected line after the CPU plays `first_move`, read back from the TT's
+        best moves (so only as long as the TT still remembers it).
+        """
+        pv = [first_move]
+        to_move = self.CPU
+        board.make_move(first_move, to_move)
+        played = 1
+        try:
+            while len(pv) < max_len and not board.check_winner(to_move) and not board.is_full():
+                to_move = self.PLAYER if to_move == self.CPU else self.CPU
+                entry = self.tt.get(self.tt_key(board, to_move))
+                if entry is None or entry[3] not in board.get_valid_moves():
+                    break
+                pv.append(entry[3])
+                board.make_move(entry[3], to_move)
+                played += 1
+        finally:
+            for _ in range(played):
+                board.undo_move()
+        return pv
 
     # ---------- Negamax ----------
-    def negamax(self, board, depth, alpha, beta, to_move):
+    def negamax(self, board, depth, alpha, beta, to_move, ctl=None):
         """
         Returns a score in negamax form where higher is better for the side to move,
         but the sign is derived from to_move so TT is consistent:
           color = +1 when to_move==CPU, -1 when to_move==PLAYER
           return color * (CPU-perspective score)
         """
+        # node count / time limit for this search
+        stats = None
+        if ctl is not None:
+            ctl.tick()
+            stats = ctl.stats
+
         # Derive sign from to_move (this removes a whole class of TT sign bugs)
         color = 1 if to_move == self.CPU else -1
 
@@ -191,10 +531,10 @@ class MinMax:
         if board.is_full():
             return 0
 
-        # Opening book (exact at ply 8 for side-to-move)
-        bk = self.book_lookup(board, to_move)
+        # Opening book (exact for side-to-move at any ply the book covers)
+        bk = self.book_lookup(board, to_move) if ctl is None or ctl.use_book else None
         if bk is not None:
-            return color * (bk * self.BOOK_SCORE)
+            return bk * self.BOOK_SCORE  # book values are already from the side to move
 
         # gives beter score for having more tiles in the middle
         if depth == 0:
@@ -205,6 +545,9 @@ class MinMax:
 
         # --- TT lookup (bounds + best move) ---
         tt_entry = self.tt.get(key)
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += tt_entry is not None
         tt_best = None
         alpha_orig = alpha
         beta_orig = beta
@@ -213,12 +556,16 @@ class MinMax:
             tt_depth, tt_flag, tt_value, tt_best = tt_entry
             if tt_depth >= depth:
                 if tt_flag == self.EXACT:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
                     return tt_value
                 elif tt_flag == self.LOWER:
                     alpha = max(alpha, tt_value)
                 elif tt_flag == self.UPPER:
                     beta = min(beta, tt_value)
                 if alpha >= beta:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
                     return tt_value
 
         valid_moves = board.get_valid_moves()
@@ -226,7 +573,7 @@ class MinMax:
             return 0
 
         # --- Move ordering: TT best first, then center preference ---
-        ordered_moves = sorted(valid_moves, key=lambda c: abs(3 - c))
+        ordered_moves = [c for c in self.move_order if c in valid_moves]
         if tt_best is not None and tt_best in valid_moves:
             ordered_moves.remove(tt_best)
             ordered_moves.insert(0, tt_best)
@@ -250,6 +597,9 @@ class MinMax:
                     best_move = col
                 alpha = max(alpha, best_value)
                 if alpha >= beta:
+                    if stats is not None:
+                        stats.cutoffs += 1
+                        stats.first_move_cutoffs += col == ordered_moves[0]
                     break
                 continue
 
@@ -267,7 +617,7 @@ class MinMax:
                     board.undo_move()
                     continue
             # run for next depth up
-            score = -self.negamax(board, depth - 1, -beta, -alpha, opp)
+            score = -self.negamax(board, depth - 1, -beta, -alpha, opp, ctl)
             board.undo_move()
 
             if score > best_value:
@@ -276,6 +626,9 @@ class MinMax:
 
             alpha = max(alpha, best_value)
             if alpha >= beta:
+                if stats is not None:
+                    stats.cutoffs += 1
+                    stats.first_move_cutoffs += col == ordered_moves[0]
                 break
 
         # --- TT store: EXACT / LOWER / UPPER ---
@@ -286,6 +639,9 @@ class MinMax:
         else:
             flag = self.EXACT
 
+        if stats is not None:
+            stats.tt_stores += 1
+
         self.tt[key] = (depth, flag, best_value, best_move)
         return best_value
 
@@ -0,0 +1,163 @@
+"""
+admission.py
+
+Admission control for engine searches.
+
+At most C4_ENGINE_CONCURRENCY searches run at once; up to C4_ENGINE_QUEUE more
+may wait for a slot. Each request has a deadline (C4_REQUEST_DEADLINE) that
+covers both the wait and the search: the search gets whatever time is left.
+Once the queue is deeper than C4_DEGRADE_QUEUE, searches are cut to a lower
+depth and a shorter time budget so the queue drains. A full queue, or a
+request that can't get a slot before its deadline, raises EngineBusy, which
+the app turns into a 503 with Retry-After.
+
+Background jobs (jobs.py) take their queue place with reserve() when they
+are submitted, so a full queue turns them away up front too, instead of
+letting them pile up in the executor and fail later.
+"""
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import BoundedSemaphore, Lock
+
+
+ENGINE_CONCURRENCY = int(os.environ.get("C4_ENGINE_CONCURRENCY", 2))
+ENGINE_QUEUE = int(os.environ.get("C4_ENGINE_QUEUE", 32))
+REQUEST_DEADLINE = float(os.environ.get("C4_REQUEST_DEADLINE", 10))
+DEGRADE_QUEUE = int(os.environ.get("C4_DEGRADE_QUEUE", 8))
+DEGRADED_DEPTH = int(os.environ.get("C4_DEGRADED_DEPTH", 4))
+DEGRADED_TIME = float(os.environ.get("C4_DEGRADED_TIME", 1))
+
+
+class EngineBusy(Exception):
+    """No engine capacity for this request; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Budget:
+    """What a search may spend once it has a slot."""
+    time_limit: float
+    max_depth: int | None = None
+    degraded: bool = False
+    queue_depth: int = 0  # searches that were waiting beyond the running ones when this one queued
+
+
+class Reservation:
+    """A queue place taken ahead of time by reserve(), used up by slot() or given back with release()."""
+
+    def __init__(self):
+        self.held = True
+
+
+class Admission:
+    def __init__(self, max_concurrent: int = ENGINE_CONCURRENCY, max_queue: int = ENGINE_QUEUE,
+                 deadline: float = REQUEST_DEADLINE, degrade_queue: int = DEGRADE_QUEUE):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.degrade_queue = degrade_queue
+
+        self._slots = BoundedSemaphore(max_concurrent)
+        self._lock = Lock()
+        self.waiting = 0
+        self.running = 0
+        self.reserved = 0  # queue places held by submitted background jobs
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.degraded = 0
+
+    def retry_after(self) -> int:
+        # rough guess: how many "rounds" of searches are ahead of a new request
+        return max(1, int((self.waiting + self.reserved) / max(1, self.max_concurrent)) + 1)
+
+    def _queue_full(self) -> bool:
+        # searches beyond the running slots count against the queue
+        return self.running + self.waiting + self.reserved >= self.max_concurrent + self.max_queue
+
+    def check(self) -> None:
+        """Cheap pre-check before queueing work: raises EngineBusy if the queue is already full."""
+        with self._lock:
+            if self._queue_full():
+                self.rejected += 1
+                raise EngineBusy("Engine queue is full", self.retry_after())
+
+    def reserve(self) -> Reservation:
+        """Takes a queue place now for a search that starts later. Raises EngineBusy if the queue is full."""
+        with self._lock:
+            if self._queue_full():
+                self.rejected += 1
+                raise EngineBusy("Engine queue is full", self.retry_after())
+            self.reserved += 1
+        return Reservation()
+
+    def release(self, reservation: Reservation) -> None:
+        """Gives back a reservation slot() never used (e.g. the move came from the cache)."""
+        with self._lock:
+            if reservation.held:
+                reservation.held = False
+                self.reserved -= 1
+
+    @contextmanager
+    def slot(self, started: float | None = None, reservation: Reservation | None = None):
+        """
+        Waits for a search slot and yields the Budget for the search.
+        `started` is when the request arrived (time.monotonic()); the deadline counts from there.
+        A `reservation` from reserve() already holds a queue place, so it is not checked again.
+        """
+        started = time.monotonic() if started is None else started
+        with self._lock:
+            if reservation is not None and reservation.held:
+                reservation.held = False
+                self.reserved -= 1
+            elif self._queue_full():
+                self.rejected += 1
+                raise EngineBusy("Engine queue is full", self.retry_after())
+            self.waiting += 1
+            queue_depth = max(0, self.running + self.waiting + self.reserved - self.max_concurrent)
+
+        remaining = self.deadline - (time.monotonic() - started)
+        acquired = remaining > 0 and self._slots.acquire(timeout=remaining)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.timed_out += 1
+                raise EngineBusy("Timed out waiting for the engine", self.retry_after())
+            self.running += 1
+            self.admitted += 1
+
+        try:
+            remaining = max(0.05, self.deadline - (time.monotonic() - started))
+            if queue_depth > self.degrade_queue:
+                with self._lock:
+                    self.degraded += 1
+                yield Budget(time_limit=min(remaining, DEGRADED_TIME), max_depth=DEGRADED_DEPTH,
+                             degraded=True, queue_depth=queue_depth)
+            else:
+                yield Budget(time_limit=remaining, queue_depth=queue_depth)
+        finally:
+            with self._lock:
+                self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "waiting": self.waiting,
+                "reserved": self.reserved,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "degraded": self.degraded,
+            }
@@ -1,36 +1,104 @@
 from __future__ import annotations
 
+import atexit
+import json
+import logging
+import os
+import secrets
+import time
 import uuid
-from threading import Lock
+from concurrent.futures import TimeoutError as FutureTimeout
 from dataclasses import dataclass
 
-from flask import Flask, jsonify, request, make_response, render_template
+from flask import Flask, Response, g, jsonify, request, make_response, render_template
 
+import metrics
+import state_token
+from admission import EngineBusy
 from board import ConnectFourBoard
-from CPUAlgorithm import MinMax
+from engine import EngineService
+from jobs import JobQueue, MoveJob
+from levels import DEFAULT_LEVEL, LEVEL_IDS, LEVELS, level_by_id
+from opening_tree import load_or_build
+from profiler import MoveProfiler
+from session_store import GameStore
+from warmup import Warmup
 
 
 app = Flask(__name__)
 
-# In-memory game store (fine for a live presentation demo).
+# One engine (and one bounded TT) for every game in this process
+engine = EngineService()
+atexit.register(engine.save_snapshot)
+atexit.register(engine.save_move_cache)
+atexit.register(lambda: engine.profiler and engine.profiler.write_report())
+
+
+# Prometheus metrics (GET /metrics)
+REGISTRY = metrics.Registry()
+REQUEST_LATENCY = REGISTRY.register(metrics.Histogram(
+    "c4_http_request_duration_seconds", "Time to answer a request, by route.", ("route", "method")))
+REQUESTS = REGISTRY.register(metrics.Counter(
+    "c4_http_requests_total", "Requests answered, by route and status.", ("route", "method", "status")))
+SEARCH_TIME = REGISTRY.register(metrics.Histogram(
+    "c4_engine_search_duration_seconds", "Time spent in engine searches, by difficulty level.", ("level",)))
+SEARCH_NODES = REGISTRY.register(metrics.Counter(
+    "c4_engine_nodes_total", "Nodes searched (needs C4_SEARCH_STATS=1).", ("level",)))
+
+
+def on_search(key, level, seconds, stats):
+    SEARCH_TIME.observe(seconds, level)
+    if stats is not None:
+        SEARCH_NODES.inc(level, amount=stats.nodes)
+        # per-search cost in the log when C4_SEARCH_STATS=1
+        app.logger.info("search %x/%x [%s] %s", key[0], key[1], level, stats)
+
+
+engine.on_search = on_search
+if engine.search_stats:
+    app.logger.setLevel(logging.INFO)  # the per-search lines are info; Flask only shows warnings by default
+
+# CPU replies for the first few plies, computed (or loaded) once at startup
+engine.replies = load_or_build(engine)
+# the CPU's opening move never changes, so new games and resets just replay it
+FIRST_MOVE = engine.best_move(ConnectFourBoard())
+
+# Search common early positions before taking traffic (see /api/ready)
+warmup = Warmup(engine)
+warmup.start()
+
+# Engine threads for background CPU moves ({"async": true} on /api/move)
+jobs = JobQueue(engine)
+
+# In-memory game store, bounded by size and idle time (see session_store.py).
 # For a production/multi-server environment you’d use Redis or a DB.
-games_lock = Lock()
-games: dict[str, "Game"] = {}
+games = GameStore()
+games.start_sweeper()
+
+# Stateless mode: the position travels in a signed cookie instead of the store,
+# so any worker/host can serve any request. Every worker needs the same secret.
+STATELESS = os.environ.get("C4_STATELESS") == "1"
+STATE_COOKIE = "c4_state"
+TOKEN_SECRET = os.environ.get("C4_TOKEN_SECRET", "").encode()
+# /api/profile needs this in an X-Admin-Token header (unset = endpoint disabled)
+ADMIN_TOKEN = os.environ.get("C4_ADMIN_TOKEN", "")
+if STATELESS and not TOKEN_SECRET:
+    print("C4_TOKEN_SECRET is not set; using a random per-process secret (single worker only).")
+    TOKEN_SECRET = secrets.token_bytes(32)
 
 
 @dataclass
 class Game:
     board: ConnectFourBoard
-    ai: MinMax
+    pending_job: str | None = None  # background CPU search for this game (not kept in stateless mode)
+    level: str = DEFAULT_LEVEL  # difficulty (levels.py), chosen on reset
     # You can add statistics here later if you want (nodes searched, depth, etc.)
 
-def start_new_game_cpu_first() -> Game:
-    g = Game(board=ConnectFourBoard(), ai=MinMax())
+def start_new_game_cpu_first(level: str = DEFAULT_LEVEL) -> Game:
+    g = Game(board=ConnectFourBoard(), level=level)
 
     # CPU plays first move immediately (so clients always see CPU start)
-    cpu_col = g.ai.MinMaxCalculate(g.board)
-    if cpu_col in g.board.get_valid_moves():
-        g.board.make_move(cpu_col, 0)  # CPU = 0
+    g.board.make_move(FIRST_MOVE, 0)  # CPU = 0
 
     return g
 
@@ -43,12 +111,64 @@ def get_game_id() -> str:
 
 
 def get_or_create_game(gid: str) -> Game:
-    with games_lock:
-        g = games.get(gid)
-        if g is None:
-            g = start_new_game_cpu_first()
-            games[gid] = g
-        return g
+    return games.get_or_create(gid, start_new_game_cpu_first)
+
+
+def load_game() -> tuple[str, Game]:
+    """Current game for this request: from the state cookie when stateless, else from the store."""
+    if STATELESS:
+        decoded = state_token.decode(request.cookies.get(STATE_COOKIE, ""), TOKEN_SECRET)
+        level = level_by_id(decoded[1]) if decoded is not None else None
+        game = Game(board=decoded[0], level=level.name) if level is not None else start_new_game_cpu_first()
+        return "", game
+
+    gid = get_game_id()
+    return gid, get_or_create_game(gid)
+
+
+def save_game(resp, gid: str, game: Game):
+    """Hands the game back to the client (state token) or just refreshes the game id cookie."""
+    if STATELESS:
+        token = state_token.encode(game.board, TOKEN_SECRET, LEVEL_IDS[game.level])
+        resp.set_cookie(STATE_COOKIE, token, samesite="Lax", httponly=True)
+    else:
+        resp.set_cookie("c4_gid", gid, samesite="Lax")
+    return resp
+
+
+def cpu_to_move(board: ConnectFourBoard) -> bool:
+    # the CPU always opens, so it moves on even plies
+    return (board.cpu_board | board.player_board).bit_count() % 2 == 0
+
+
+def settle_job(game: Game, job: MoveJob | None) -> None:
+    """Plays a finished job's move, but only if the game is still in the position it searched."""
+    if job is None or not job.done():
+        return
+    board = game.board
+    if job.future.exception() is None and (board.cpu_board, board.player_board) == job.position:
+        cpu_col = job.future.result()
+        if cpu_col in board.get_valid_moves():  # safety
+            board.make_move(cpu_col, 0)  # CPU = 0
+    if game.pending_job == job.id:
+        game.pending_job = None
+
+
+def settle_pending(game: Game) -> None:
+    # stateless games don't carry a job id, so fall back to the job for their position
+    settle_job(game, jobs.get(game.pending_job) if game.pending_job else jobs.find(game.board, game.level))
+
+
+def cpu_job_for(game: Game) -> MoveJob | None:
+    """The search the game is waiting on, started here if the CPU is to move and nothing is running."""
+    board = game.board
+    if winner_of(board) is not None or not cpu_to_move(board):
+        return None
+    job = jobs.get(game.pending_job) if game.pending_job else jobs.find(board, game.level)
+    if job is None or job.position != (board.cpu_board, board.player_board) or job.future.exception() is not None:
+        job = jobs.submit(board, game.level)
+        game.pending_job = job.id
+    return job
 
 
 def board_to_matrix(board: ConnectFourBoard) -> list[list[str]]:
@@ -72,67 +192,171 @@ def board_to_matrix(board: ConnectFourBoard) -> list[list[str]]:
     return out
 
 
-def game_status(game: Game) -> dict:
-    board = game.board
-
-    winner = None
+def winner_of(board: ConnectFourBoard) -> str | None:
     if board.check_winner(1):
-        winner = "PLAYER"
-    elif board.check_winner(0):
-        winner = "CPU"
-    elif board.is_full():
-        winner = "DRAW"
-
-    return {
-        "grid": board_to_matrix(board),
+        return "PLAYER"
+    if board.check_winner(0):
+        return "CPU"
+    if board.is_full():
+        return "DRAW"
+    return None
+
+
+def wants_grid() -> bool:
+    # older clients can still ask for the 6x7 string matrix with ?format=grid
+    return request.args.get("format") == "grid"
+
+
+def game_status(game: Game, grid: bool = False) -> dict:
+    """
+    Compact state: the two bitboards (bit = col*7 + row, row 0 at the bottom)
+    instead of a 6x7 matrix, which is only included when asked for.
+    """
+    board = game.board
+    status = {
+        "cpu": board.cpu_board,
+        "player": board.player_board,
         "valid_moves": board.get_valid_moves(),
-        "winner": winner,
+        "winner": winner_of(board),
+        "level": game.level,
     }
+    if grid:
+        status["grid"] = board_to_matrix(board)
+    return status
+
+
+def state_etag(game: Game, job: MoveJob | None) -> str:
+    board = game.board
+    return f"{board.cpu_board:x}-{board.player_board:x}-{game.level}-{job.id if job else ''}-{int(wants_grid())}"
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(resp):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - start, route, request.method)
+        REQUESTS.inc(route, request.method, resp.status_code)
+    return resp
+
+
+@REGISTRY.collector
+def engine_metrics() -> list[str]:
+    stats = engine.stats()
+    admission = stats["admission"]
+    cache = stats["move_cache"]
+    store = games.stats()
+    lines = []
+    for name, kind, help_text, value in (
+        ("c4_tt_entries", "gauge", "Entries in the shared transposition table.", stats["tt_entries"]),
+        ("c4_tt_capacity", "gauge", "TT size at which it is cleared.", engine.ai.tt_max_entries),
+        ("c4_engine_searches_total", "counter", "Searches actually run.", stats["searches"]),
+        ("c4_engine_coalesced_total", "counter", "Requests that waited on an identical search.", stats["coalesced"]),
+        ("c4_engine_downgraded_total", "counter", "Searches dropped to a lower level under load.", stats["downgraded"]),
+        ("c4_engine_running", "gauge", "Searches running now.", admission["running"]),
+        ("c4_engine_queue_depth", "gauge", "Searches waiting for an engine slot (queued background jobs included).",
+         admission["waiting"] + admission["reserved"]),
+        ("c4_engine_rejected_total", "counter", "Searches refused because the queue was full.", admission["rejected"]),
+        ("c4_engine_timed_out_total", "counter", "Searches that gave up waiting for a slot.", admission["timed_out"]),
+        ("c4_engine_degraded_total", "counter", "Searches cut down under load.", admission["degraded"]),
+        ("c4_jobs_pending", "gauge", "Background CPU moves not finished yet.", jobs.pending()),
+        ("c4_book_hits_total", "counter", "Moves answered from the opening book.", stats["book_hits"]),
+        ("c4_reply_tree_hits_total", "counter", "Moves answered from the precomputed reply tree.", stats["reply_hits"]),
+        ("c4_move_cache_hits_total", "counter", "Best-move cache hits.", cache["hits"]),
+        ("c4_move_cache_misses_total", "counter", "Best-move cache misses.", cache["misses"]),
+        ("c4_move_cache_entries", "gauge", "Entries in the best-move cache.", cache["entries"]),
+        ("c4_games_active", "gauge", "Games held in the in-memory store.", store["active"]),
+        ("c4_games_capacity", "gauge", "Games the store holds before evicting.", store["capacity"]),
+    ):
+        lines += metrics.sample(name, kind, help_text, value)
+
+    totals = stats.get("search_totals")
+    if totals is not None:
+        lines += metrics.sample("c4_tt_probes_total", "counter", "TT probes during searches.", totals["tt_probes"])
+        lines += metrics.sample("c4_tt_hits_total", "counter", "TT probes that found an entry.", totals["tt_hits"])
+        lines += metrics.sample("c4_tt_hit_ratio", "gauge", "TT hits / probes since startup.", totals["tt_hit_rate"])
+    return lines
+
+
+@app.errorhandler(EngineBusy)
+def engine_busy(e: EngineBusy):
+    """Backpressure: the engine queue is full or the request ran out of time waiting for it."""
+    resp = jsonify({"error": str(e), "retry_after": e.retry_after})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
 
 
 @app.get("/")
 def index():
-    gid = get_game_id()
-    _ = get_or_create_game(gid)
-    resp = make_response(render_template("index.html"))
-    resp.set_cookie("c4_gid", gid, samesite="Lax")
-    return resp
+    gid, game = load_game()
+    resp = make_response(render_template("index.html", levels=list(LEVELS), level=game.level))
+    return save_game(resp, gid, game)
 
 
 @app.get("/api/state")
 def api_state():
-    gid = get_game_id()
-    game = get_or_create_game(gid)
-    resp = jsonify(game_status(game))
-    resp.set_cookie("c4_gid", gid, samesite="Lax")
-    return resp
+    gid, game = load_game()
+    if cpu_to_move(game.board):
+        settle_pending(game)
+
+    job = cpu_job_for(game)
+
+    # conditional GET: nothing changed since the client's copy
+    etag = state_etag(game, job)
+    if request.if_none_match.contains(etag):
+        resp = make_response("", 304)
+    else:
+        status = game_status(game, wants_grid())
+        if job is not None:
+            status["job"] = job.id
+        resp = jsonify(status)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return save_game(resp, gid, game)
 
 
 @app.post("/api/reset")
 def api_reset():
-    gid = get_game_id()
-    with games_lock:
-        games[gid] = start_new_game_cpu_first()
-    resp = jsonify(game_status(games[gid]))
-    resp.set_cookie("c4_gid", gid, samesite="Lax")
-    return resp
+    """New game; {"level": name} picks the difficulty, otherwise the current game's level is kept."""
+    gid, current = load_game()
+    data = request.get_json(silent=True) or {}
+    level = data.get("level", current.level)
+    if not isinstance(level, str) or level not in LEVELS:
+        return jsonify({"error": f"Unknown level, expected one of: {', '.join(LEVELS)}"}), 400
+
+    game = start_new_game_cpu_first(level)
+    if not STATELESS:
+        games.put(gid, game)
+    return save_game(jsonify(game_status(game, wants_grid())), gid, game)
 
 
 @app.post("/api/move")
 def api_move():
-    gid = get_game_id()
-    game = get_or_create_game(gid)
+    started = time.monotonic()
+    gid, game = load_game()
     board = game.board
-    ai = game.ai
 
     data = request.get_json(silent=True) or {}
     if "col" not in data:
         return jsonify({"error": "Missing 'col'"}), 400
 
     # If already over, just return current state
-    status = game_status(game)
+    status = game_status(game, wants_grid())
     if status["winner"] is not None:
-        return jsonify(status)
+        return save_game(jsonify(status), gid, game)
+
+    # Still waiting on a background CPU move
+    if cpu_to_move(board):
+        settle_pending(game)
+    if cpu_to_move(board):
+        job = cpu_job_for(game)
+        return save_game(jsonify({"error": "CPU is still thinking", "job": job.id}), gid, game), 409
 
     try:
         col = int(data["col"])
@@ -142,6 +366,9 @@ def api_move():
     if col not in board.get_valid_moves():
         return jsonify({"error": "Invalid move"}), 400
 
+    # turn the move away up front if the engine can't take another search
+    engine.admission.check()
+
     # 1) Player move
     try:
         board.make_move(col, 1)  # PLAYER = 1
@@ -149,16 +376,173 @@ def api_move():
         return jsonify({"error": str(e)}), 400
 
     # Check if player ended the game
-    status = game_status(game)
+    status = game_status(game, wants_grid())
     if status["winner"] is not None:
-        return jsonify(status)
+        return save_game(jsonify(status), gid, game)
 
-    # 2) CPU move
-    cpu_col = ai.MinMaxCalculate(board)
+    # 2) CPU move, in the background if the client asked for it.
+    # If the engine turns us away, take the player's move back so the retry starts clean.
+    try:
+        if data.get("async"):
+            job = jobs.submit(board, game.level)
+            game.pending_job = job.id
+            status["job"] = job.id
+            return save_game(jsonify(status), gid, game), 202
+
+        cpu_col = engine.best_move(board, started, game.level)
+    except EngineBusy:
+        board.undo_move()
+        raise
     if cpu_col in board.get_valid_moves():  # safety
         board.make_move(cpu_col, 0)  # CPU = 0
 
-    return jsonify(game_status(game))
+    return save_game(jsonify(game_status(game, wants_grid())), gid, game)
+
+
+@app.get("/api/jobs/<job_id>")
+def api_job(job_id: str):
+    """Poll a background CPU move: 202 while searching, then the game state with the move played."""
+    gid, game = load_game()
+    job = jobs.get(job_id)
+    if job is None:
+        # unknown here (another worker, or expired): search again if the CPU is still to move
+        job = cpu_job_for(game)
+    elif job.done():
+        error = job.future.exception()
+        if isinstance(error, EngineBusy):
+            raise error
+        if error is not None:
+            return jsonify({"error": "Engine error"}), 500
+        settle_job(game, job)
+        job = None
+
+    board = game.board
+    if job is not None and job.position == (board.cpu_board, board.player_board):
+        return save_game(jsonify({"status": "pending", "job": job.id}), gid, game), 202
+
+    status = game_status(game, wants_grid())
+    status["status"] = "done"
+    return save_game(jsonify(status), gid, game)
+
+
+@app.get("/api/jobs/<job_id>/events")
+def api_job_events(job_id: str):
+    """Server-Sent Events: one 'done' event when the search finishes, then fetch /api/jobs/<id>."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def stream():
+        while True:
+            try:
+                job.future.result(timeout=15)
+                break
+            except FutureTimeout:
+                yield ": keep-alive\n\n"
+            except Exception:
+                break
+        yield f"event: done\ndata: {json.dumps({'job': job.id})}\n\n"
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def move_analysis(col: int, score: float) -> dict:
+    """One column of an analysis: a known result, or the heuristic score."""
+    limit = engine.ai.BOOK_SCORE - 1000  # book and search wins/losses sit at or past this
+    if score >= limit:
+        return {"col": col, "result": "win", "score": None}
+    if score <= -limit:
+        return {"col": col, "result": "loss", "score": None}
+    return {"col": col, "result": None, "score": int(score)}
+
+
+@app.get("/api/analyze")
+def api_analyze():
+    """
+    Scores every legal move for the side to move, best first.
+    ?moves=3342 analyzes that position (columns, first player first) instead of the current game;
+    ?solve=1 searches to the end of the game (exact results, within the request deadline);
+    ?level=name picks the search budget (default: the game's level).
+    """
+    started = time.monotonic()
+    gid, game = load_game()
+    level = request.args.get("level", game.level)
+    if not isinstance(level, str) or level not in LEVELS:
+        return jsonify({"error": f"Unknown level, expected one of: {', '.join(LEVELS)}"}), 400
+
+    moves = request.args.get("moves")
+    if moves is None:
+        board = game.board
+    else:
+        try:
+            board = ConnectFourBoard.from_moves(moves)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    if winner_of(board) is not None:
+        return jsonify({"error": "Game is over"}), 400
+
+    # the engine always scores moves for its CPU (player 0), so turn the board around for player 1
+    cpu_side = cpu_to_move(board)
+    view = board if cpu_side else board.flipped()
+    solve = request.args.get("solve") in ("1", "true")
+    scores, depth = engine.analyze(view, started, level, solve)
+
+    ranked = [move_analysis(col, score) for col, score in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+    empties = 42 - (board.cpu_board | board.player_board).bit_count()
+    analysis = {
+        "to_move": "CPU" if cpu_side else "PLAYER",
+        "depth": depth,
+        # searched to the end, or every move already has a proven result
+        "exact": bool(ranked) and (depth >= empties or all(m["result"] for m in ranked)),
+        "moves": ranked,
+    }
+    return save_game(jsonify(analysis), gid, game)
+
+
+@app.get("/api/ready")
+def api_ready():
+    """Readiness probe: 503 until this worker's warm-up is done."""
+    stats = warmup.stats()
+    return jsonify(stats), (200 if stats["ready"] else 503)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text format."""
+    return Response(REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/api/profile", methods=["GET", "POST"])
+def api_profile():
+    """
+    GET: the hot-function report for the searches profiled so far.
+    POST {"enabled": true|false}: start (fresh) or stop profiling engine searches.
+    """
+    if not ADMIN_TOKEN or not secrets.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        return jsonify({"error": "Forbidden"}), 403
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        if data.get("enabled"):
+            engine.profiler = MoveProfiler()
+        elif engine.profiler is not None:
+            engine.profiler.write_report()
+            engine.profiler = None
+        return jsonify({"enabled": engine.profiler is not None})
+
+    if engine.profiler is None:
+        return jsonify({"error": "Profiling is off"}), 404
+    return Response(engine.profiler.report(), content_type="text/plain; charset=utf-8")
+
+
+@app.get("/api/stats")
+def api_stats():
+    return jsonify({
+        "games": games.stats(),
+        "engine": engine.stats(),
+        "pending_jobs": jobs.pending(),
+        "warmup": warmup.stats(),
+    })
 
 
 if __name__ == "__main__":
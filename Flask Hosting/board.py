@@ -1,3 +1,12 @@
+def mirror_bitboard(bb: int) -> int:
+    """The bitboard flipped left to right (column c -> 6 - c)."""
+    # move whole 7-bit columns instead of single cells
+    out = 0
+    for col in range(7):
+        out |= ((bb >> (col * 7)) & 0x7F) << ((6 - col) * 7)
+    return out
+
+
 class ConnectFourBoard:
     def __init__(self):
         """Initialize a new board"""
@@ -13,6 +22,49 @@ class ConnectFourBoard:
         self.cpu_board = 0
         self.turn = 0 # 0 = cpu, 1 = player
         self.heights = [0] * self.num_cols
+
+    @classmethod
+    def from_bitboards(cls, cpu_board: int, player_board: int):
+        """
+        Build a board straight from two bitboards (no move history).
+        Column heights are recovered from the occupied bits.
+        """
+        board = cls()
+        board.cpu_board = cpu_board
+        board.player_board = player_board
+        occupied = cpu_board | player_board
+        for col in range(board.num_cols):
+            board.heights[col] = ((occupied >> (col * 7)) & 0x7F).bit_count()
+        return board
+
+    @classmethod
+    def from_moves(cls, moves: str):
+        """
+        Board after a move string such as "3342": the columns (0-6) played from
+        the empty board, first player as turn 0 (the cpu_board pieces).
+        Raises ValueError for a bad column, a full column, or a move after the game is over.
+        """
+        board = cls()
+        for i, ch in enumerate(moves):
+            if board.game_over():
+                raise ValueError(f"Game is already over before move {i + 1} of {moves}")
+            if ch not in "0123456":
+                raise ValueError(f"Bad column '{ch}' at move {i + 1} of {moves}")
+            if board.heights[int(ch)] >= board.num_rows:
+                raise ValueError(f"Column {ch} is full at move {i + 1} of {moves}")
+            board.make_move(int(ch), i % 2)
+        return board
+
+    def flipped(self):
+        """The same position with the two sides' pieces swapped (no move history)."""
+        return ConnectFourBoard.from_bitboards(self.player_board, self.cpu_board)
+
+    def to_move(self) -> int:
+        """Turn (0/1) to move, counting turn 0 as the side that moved first."""
+        return (self.cpu_board | self.player_board).bit_count() % 2
+
+    def game_over(self) -> bool:
+        return self.check_winner(0) or self.check_winner(1) or self.is_full()
     
     def display(self):
         '''Display the board state for the player'''
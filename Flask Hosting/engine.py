@@ -0,0 +1,304 @@
+"""
+engine.py
+
+One MinMax per process, shared by every web game.
+
+Games only keep their board; all searches go through the same engine and
+its single bounded transposition table, so a position solved for one
+visitor is already in the TT for the next.
+
+Searches are single-flight: positions are keyed by their canonical
+(mirror-folded) form, the first request for a position runs the search and
+any identical request arriving meanwhile waits on the same future. Finished
+answers go into a shared LRU best-move cache (move_cache.py) that is checked
+before the engine is ever asked.
+
+Each search runs at a difficulty level (levels.py); the level's budget is
+combined with whatever the admission control allows at the time.
+
+MinMax is pure Python and holds the GIL, so searches run on this process's
+shared TT use one core between them, however many threads wait on them.
+With C4_SEARCH_PROCESSES=N the searches themselves go to N worker processes
+instead (each with its own MinMax and TT, loaded from the snapshot if there
+is one), and up to N really run at once. The caches, single-flight and
+admission control stay in this process; analyze() and the TT snapshot
+written on shutdown still use the in-process engine.
+
+analyze() scores every legal move instead of picking one (hints, training);
+it goes through the same admission control and TT but skips the caches.
+"""
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import Future
+from functools import partial
+from multiprocessing import Pool
+from threading import Lock
+
+from admission import Admission, Reservation
+from board import ConnectFourBoard, mirror_bitboard
+from CPUAlgorithm import MinMax, SearchStats
+from levels import DEFAULT_LEVEL, Level, for_load, get_level
+from move_cache import MoveCache, MoveCacheError
+from profiler import PROFILE_REPORT, MoveProfiler
+from tt_snapshot import SnapshotError
+
+
+# TT cap for the whole process (MinMax clears its TT past this)
+TT_MAX_ENTRIES = int(os.environ.get("C4_TT_MAX_ENTRIES", 2_000_000))
+# optional snapshot loaded at startup and written back on shutdown
+TT_SNAPSHOT = os.environ.get("C4_TT_SNAPSHOT")
+# best-move cache size (LRU) and optional file it is loaded from / saved to
+MOVE_CACHE_MAX = int(os.environ.get("C4_MOVE_CACHE_MAX", 200_000))
+MOVE_CACHE_FILE = os.environ.get("C4_MOVE_CACHE")
+# 1 = collect per-search stats (nodes, NPS, TT hit rate, cutoffs) for /api/stats and the log
+SEARCH_STATS = os.environ.get("C4_SEARCH_STATS") == "1"
+# >0 = run searches in this many worker processes (see above); 0 = in this process on the shared TT
+SEARCH_PROCESSES = int(os.environ.get("C4_SEARCH_PROCESSES", 0))
+
+
+class EngineService:
+    def __init__(self, tt_max_entries: int = TT_MAX_ENTRIES, snapshot_path: str | None = TT_SNAPSHOT,
+                 move_cache_max: int = MOVE_CACHE_MAX, move_cache_path: str | None = MOVE_CACHE_FILE,
+                 search_stats: bool = SEARCH_STATS, search_processes: int = SEARCH_PROCESSES):
+        self.ai = MinMax()
+        self.ai.tt_max_entries = tt_max_entries
+        self.snapshot_path = snapshot_path
+        self.snapshot_lock = Lock()
+
+        # canonical position -> (best move in canonical orientation, score)
+        self.move_cache = MoveCache(move_cache_max)
+        self.move_cache_path = move_cache_path
+        # precomputed opening replies (opening_tree.py), checked before anything else
+        self.replies: dict[tuple[int, int], tuple[int, float | None]] = {}
+        self._inflight: dict[tuple[int, int], Future] = {}
+        self._lock = Lock()
+        self.admission = Admission()
+        self.searches = 0   # searches actually run
+        self.coalesced = 0  # requests that waited on someone else's search
+        self.level_searches: dict[str, int] = {}  # searches run, by the level they ran at
+        self.downgraded = 0  # searches dropped to a lower level under load
+        self.reply_hits = 0  # answers from the precomputed reply tree
+        self.analyses = 0  # analyze() calls run
+        # totals of every search's SearchStats, and an optional hook called as
+        # on_search(key, level name, seconds, stats or None) after each search
+        # (app.py logs and records metrics with it)
+        self.search_stats = search_stats
+        self.search_totals = SearchStats() if search_stats else None
+        self.on_search = None
+        # cProfile every search (C4_PROFILE=<report file>, or switched on via /api/profile)
+        self.profiler = MoveProfiler() if PROFILE_REPORT else None
+
+        self.snapshot_entries = 0  # TT entries loaded from the snapshot at startup
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                self.snapshot_entries = self.ai.load_tt(snapshot_path)
+            except SnapshotError as e:
+                print(f"Ignoring TT snapshot {snapshot_path}: {e}")
+
+        if move_cache_path and os.path.exists(move_cache_path):
+            try:
+                self.move_cache.load(move_cache_path)
+            except MoveCacheError as e:
+                print(f"Ignoring move cache {move_cache_path}: {e}")
+
+        # created last, and before the app starts any threads, so the fork copies nothing half-locked
+        self.pool = None
+        if search_processes > 0:
+            self.pool = Pool(search_processes, initializer=_init_search_process,
+                             initargs=(tt_max_entries, snapshot_path))
+
+    def canonical(self, board: ConnectFourBoard) -> tuple[tuple[int, int], bool]:
+        """(key, mirrored): the smaller of the position and its mirror image, and which one it was."""
+        key = (board.cpu_board, board.player_board)
+        mkey = (mirror_bitboard(board.cpu_board), mirror_bitboard(board.player_board))
+        if mkey < key:
+            return mkey, True
+        return key, False
+
+    def best_move(self, board: ConnectFourBoard, started: float | None = None, level: str | None = None,
+                  reservation: Reservation | None = None) -> int:
+        return self.search(board, started, level, reservation)[0]
+
+    def search(self, board: ConnectFourBoard, started: float | None = None,
+               level: str | None = None, reservation: Reservation | None = None) -> tuple[int, float | None]:
+        """
+        (CPU move, score) for `board`. The search runs on a fresh board built from
+        the canonical key, so the game's board is never touched mid-search.
+        `started` (time.monotonic()) is when the request arrived, for its deadline;
+        `level` is a levels.LEVELS name (None = the default level).
+        `reservation` is a queue place already taken with admission.reserve().
+        Raises admission.EngineBusy when there is no capacity to search.
+        """
+        key, mirrored = self.canonical(board)
+        col, score = self._canonical_search(key, started, get_level(level), reservation)
+        return (6 - col if mirrored else col), score
+
+    def _canonical_search(self, key: tuple[int, int], started: float | None, level: Level,
+                          reservation: Reservation | None = None) -> tuple[int, float | None]:
+        shared = level.name == DEFAULT_LEVEL  # reply tree and move cache hold default-level answers
+        if shared:
+            reply = self.replies.get(key)
+            if reply is not None:
+                self.reply_hits += 1
+                return reply
+
+            cached = self.move_cache.get(key)
+            if cached is not None:
+                return cached
+
+        flight = (key, level.name)
+        with self._lock:
+            fut = self._inflight.get(flight)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._inflight[flight] = fut
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return fut.result()
+
+        try:
+            with self.admission.slot(started, reservation) as budget:
+                ran = for_load(level, budget.queue_depth)
+                stats = SearchStats() if self.search_stats else None
+                search_start = time.perf_counter()
+                limits = (
+                    _tighter(ran.max_depth, budget.max_depth),
+                    _tighter(ran.time_limit, budget.time_limit),
+                    ran.node_limit,
+                    ran.use_book,
+                )
+                if self.pool is not None:
+                    # waiting on the pool releases the GIL, so other searches run meanwhile
+                    col, score, depth, stats, book_hits = self.pool.apply(_process_search, (key, *limits, stats))
+                    self.ai.book_hits += book_hits
+                else:
+                    run = self.ai.search if self.profiler is None else partial(self.profiler.call, self.ai.search)
+                    col, score, depth = run(ConnectFourBoard.from_bitboards(*key), *limits, stats)
+                seconds = time.perf_counter() - search_start
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(flight, None)
+            fut.set_exception(e)
+            raise
+
+        # cache before leaving the in-flight table so nobody starts a second search.
+        # Only answers searched to the level's full depth are kept: one cut short by
+        # the request deadline or cut down under load would stick for good.
+        result = (col, score)
+        if shared and ran is level and depth >= level.max_depth:
+            self.move_cache.put(key, *result)
+        with self._lock:
+            self.searches += 1
+            self.level_searches[ran.name] = self.level_searches.get(ran.name, 0) + 1
+            if ran is not level:
+                self.downgraded += 1
+            self._inflight.pop(flight, None)
+            if stats is not None:
+                self.search_totals.merge(stats)
+        fut.set_result(result)
+        if self.on_search is not None:
+            self.on_search(key, ran.name, seconds, stats)
+        return result
+
+    def analyze(self, board: ConnectFourBoard, started: float | None = None, level: str | None = None,
+                solve: bool = False) -> tuple[dict[int, float], int]:
+        """
+        ({col: score}, depth) for every legal CPU move on `board`, scored with
+        MinMax.analyze at the level's budget (solve=True: to the end of the game,
+        still bounded by the request's time). Raises admission.EngineBusy like search().
+        """
+        key, mirrored = self.canonical(board)
+        with self.admission.slot(started) as budget:
+            ran = for_load(get_level(level), budget.queue_depth)
+            stats = SearchStats() if self.search_stats else None
+            run = self.ai.analyze if self.profiler is None else partial(self.profiler.call, self.ai.analyze)
+            scores, depth = run(
+                ConnectFourBoard.from_bitboards(*key),
+                _tighter(ran.max_depth, budget.max_depth),
+                _tighter(ran.time_limit, budget.time_limit),
+                ran.node_limit,
+                ran.use_book,
+                solve,
+                stats,
+            )
+        with self._lock:
+            self.analyses += 1
+            if stats is not None:
+                self.search_totals.merge(stats)
+        if mirrored:
+            scores = {6 - col: score for col, score in scores.items()}
+        return scores, depth
+
+    def tt_size(self) -> int:
+        return len(self.ai.tt)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {
+                "tt_entries": len(self.ai.tt),
+                "searches": self.searches,
+                "coalesced": self.coalesced,
+                "level_searches": dict(self.level_searches),
+                "downgraded": self.downgraded,
+                "in_flight": len(self._inflight),
+                "opening_replies": len(self.replies),
+                "reply_hits": self.reply_hits,
+                "analyses": self.analyses,
+                "book_hits": self.ai.book_hits,
+                "snapshot_entries": self.snapshot_entries,
+            }
+        out["move_cache"] = self.move_cache.stats()
+        out["admission"] = self.admission.stats()
+        if self.search_totals is not None:
+            with self._lock:
+                out["search_totals"] = self.search_totals.as_dict()
+        return out
+
+    def save_snapshot(self) -> int:
+        # with a search pool the in-process TT only saw analyze() calls; don't overwrite a good snapshot with it
+        if not self.snapshot_path or self.pool is not None:
+            return 0
+        with self.snapshot_lock:
+            return self.ai.save_tt(self.snapshot_path)
+
+    def save_move_cache(self) -> int:
+        if not self.move_cache_path:
+            return 0
+        return self.move_cache.save(self.move_cache_path)
+
+
+# ---------- search processes ----------
+_process_ai = None
+
+
+def _init_search_process(tt_max_entries: int, snapshot_path: str | None):
+    global _process_ai
+    _process_ai = MinMax()
+    _process_ai.tt_max_entries = tt_max_entries
+    if snapshot_path and os.path.exists(snapshot_path):
+        try:
+            _process_ai.load_tt(snapshot_path)
+        except SnapshotError:
+            pass  # the web process already said so
+
+
+def _process_search(key, max_depth, time_limit, node_limit, use_book, stats):
+    """One search in a worker process: (col, score, depth, stats, book hits)."""
+    book_hits = _process_ai.book_hits
+    col, score, depth = _process_ai.search(ConnectFourBoard.from_bitboards(*key), max_depth, time_limit,
+                                           node_limit, use_book, stats)
+    return col, score, depth, stats, _process_ai.book_hits - book_hits
+
+
+def _tighter(a, b):
+    """The smaller of two optional limits (None = no limit)."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
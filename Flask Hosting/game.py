@@ -1,8 +1,17 @@
 from board import ConnectFourBoard
 from input_validator import validate_char, validate_int, ValidationError
-from CPUAlgorithm import MinMax
+from CPUAlgorithm import MinMax, SearchStats
+from tt_snapshot import SnapshotError
+from profiler import PROFILE_REPORT, MoveProfiler
 import os
 
+# optional TT snapshot file so solved positions carry over between runs
+TT_SNAPSHOT = os.environ.get("C4_TT_SNAPSHOT")
+# 1 = print nodes, NPS, TT hit rate and cutoffs after every CPU move
+SEARCH_STATS = os.environ.get("C4_SEARCH_STATS") == "1"
+# C4_PROFILE=<file>: profile every CPU move and write a hot-function report there
+PROFILER = MoveProfiler() if PROFILE_REPORT else None
+
 class ConnectFourGame:
     """Represents a Connect 4 game. Manages board and players."""
 
@@ -28,6 +37,11 @@ class ConnectFourGame:
     def start(self, turn):
         round = 1
         CPU = MinMax()
+        if TT_SNAPSHOT and os.path.exists(TT_SNAPSHOT):
+            try:
+                CPU.load_tt(TT_SNAPSHOT)
+            except SnapshotError as e:
+                print(f"Ignoring TT snapshot: {e}")
         # if CPU goes first, play middle
         if turn == 0:
                 self.board.make_move(3, 0)
@@ -64,12 +78,18 @@ class ConnectFourGame:
             round += 1
 
             # CPU Turn
-            CPU_col = CPU.MinMaxCalculate(self.board)
+            stats = SearchStats() if SEARCH_STATS else None
+            if PROFILER:
+                CPU_col = PROFILER.call(CPU.MinMaxCalculate, self.board, stats=stats)
+            else:
+                CPU_col = CPU.MinMaxCalculate(self.board, stats=stats)
             self.board.make_move(CPU_col, 0)
 
             # clear the terminal and display the board state
             os.system('cls')
             self.board.display()
+            if stats is not None:
+                print(f"CPU played {CPU_col}. {stats}")
 
             # check if the CPU won or tied
             playing = self.check_board_state(0) 
@@ -77,6 +97,12 @@ class ConnectFourGame:
 
             round += 1
 
+        # keep what was solved this game for the next run
+        if TT_SNAPSHOT:
+            CPU.save_tt(TT_SNAPSHOT)
+        if PROFILER:
+            PROFILER.write_report()
+
 if __name__ == "__main__":
     
     # loop while playing the game
@@ -0,0 +1,109 @@
+"""
+jobs.py
+
+Background CPU moves.
+
+/api/move can hand the search to a small pool of engine threads and return
+right away; the client then polls /api/jobs/<id> (or listens on
+/api/jobs/<id>/events) for the reply. Request workers are never blocked on
+a search, and the number of searches running at once is capped by the pool.
+The pool's threads only wait on the engine: searches use more than one core
+only with C4_SEARCH_PROCESSES (engine.py), otherwise MinMax holds the GIL
+and a gunicorn worker's searches share one core.
+Every job holds an admission queue place from submit until it finishes, so
+a full queue is a 503 at submit time, not a failed job later.
+
+A job is tied to the position it was started from, so a result is only ever
+applied to a game that is still in that exact position.
+"""
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Lock
+
+from board import ConnectFourBoard
+
+
+ENGINE_WORKERS = int(os.environ.get("C4_ENGINE_WORKERS", 2))
+JOB_TTL = float(os.environ.get("C4_JOB_TTL", 120))  # seconds a finished job is kept for polling
+
+
+@dataclass
+class MoveJob:
+    id: str
+    position: tuple[int, int]  # (cpu_board, player_board) the search started from
+    future: Future
+    level: str | None = None  # difficulty level the move was asked for
+    created: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+
+    def done(self) -> bool:
+        return self.future.done()
+
+
+class JobQueue:
+    def __init__(self, engine, workers: int = ENGINE_WORKERS, job_ttl: float = JOB_TTL):
+        self.engine = engine
+        self.job_ttl = job_ttl
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="engine")
+        self._jobs: dict[str, MoveJob] = {}
+        self._by_position: dict[tuple, MoveJob] = {}  # newest job per (position, level)
+        self._lock = Lock()
+
+    def submit(self, board: ConnectFourBoard, level: str | None = None) -> MoveJob:
+        """
+        Starts a search for the CPU move on a snapshot of `board` at difficulty `level`.
+        Raises admission.EngineBusy right away if the engine queue is already full.
+        """
+        reservation = self.engine.admission.reserve()
+        self.prune()
+        position = (board.cpu_board, board.player_board)
+        work = ConnectFourBoard.from_bitboards(*position)
+        try:
+            future = self.executor.submit(self._run, work, level, reservation)
+        except BaseException:
+            self.engine.admission.release(reservation)
+            raise
+        job = MoveJob(id=uuid.uuid4().hex, position=position, future=future, level=level)
+        job.future.add_done_callback(lambda _: setattr(job, "finished", time.monotonic()))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._by_position[position, level] = job
+        return job
+
+    def _run(self, board: ConnectFourBoard, level: str | None, reservation) -> int:
+        # the request deadline starts when an engine thread picks the job up, not at submit:
+        # time spent behind other jobs in the executor must not eat this search's budget
+        started = time.monotonic()
+        try:
+            return self.engine.best_move(board, started, level, reservation)
+        finally:
+            # still held if the answer came without a search (cache, reply tree, someone else's search)
+            self.engine.admission.release(reservation)
+
+    def find(self, board: ConnectFourBoard, level: str | None = None) -> MoveJob | None:
+        """Latest job started from this exact position and level (stateless games don't remember their job id)."""
+        with self._lock:
+            return self._by_position.get(((board.cpu_board, board.player_board), level))
+
+    def get(self, job_id: str) -> MoveJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.done())
+
+    def prune(self) -> None:
+        """Forgets finished jobs nobody collected within the TTL."""
+        cutoff = time.monotonic() - self.job_ttl
+        with self._lock:
+            stale = [jid for jid, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]
+            for jid in stale:
+                job = self._jobs.pop(jid)
+                if self._by_position.get((job.position, job.level)) is job:
+                    del self._by_position[job.position, job.level]
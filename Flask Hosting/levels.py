@@ -0,0 +1,61 @@
+"""
+levels.py
+
+Named difficulty levels for web games, each mapped to a search budget.
+
+A game picks its level when it is (re)started (POST /api/reset {"level": ...})
+and keeps it for every CPU move. When the engine queue backs up past
+C4_DOWNGRADE_QUEUE, searches drop to the level's fallback so the fleet
+doesn't pay expert-level cost under load.
+
+Only the default level (C4_DEFAULT_LEVEL) uses the precomputed reply tree
+and the shared best-move cache; the others are either cheap enough to just
+search or deep enough that those answers would be too weak for them.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Level:
+    name: str
+    max_depth: int
+    time_limit: float | None = None  # seconds
+    node_limit: int | None = None
+    use_book: bool = True
+    fallback: str | None = None  # level to drop to when the engine is busy
+
+
+LEVELS = {
+    "easy": Level("easy", max_depth=2, use_book=False),
+    "medium": Level("medium", max_depth=4),
+    "hard": Level("hard", max_depth=8, fallback="medium"),
+    "expert": Level("expert", max_depth=16, time_limit=5.0, node_limit=50_000, fallback="hard"),
+}
+# index of each level, used to pack it into the state token
+LEVEL_IDS = {name: i for i, name in enumerate(LEVELS)}
+
+DEFAULT_LEVEL = os.environ.get("C4_DEFAULT_LEVEL", "hard")
+if DEFAULT_LEVEL not in LEVELS:
+    raise ValueError(f"C4_DEFAULT_LEVEL must be one of {', '.join(LEVELS)}")
+# queue depth (searches waiting beyond the running ones) past which levels fall back
+DOWNGRADE_QUEUE = int(os.environ.get("C4_DOWNGRADE_QUEUE", 2))
+
+
+def get_level(name: str | None) -> Level:
+    """The named level; None means the default. Raises KeyError for unknown names."""
+    return LEVELS[DEFAULT_LEVEL if name is None else name]
+
+
+def level_by_id(level_id: int) -> Level | None:
+    names = list(LEVELS)
+    return LEVELS[names[level_id]] if 0 <= level_id < len(names) else None
+
+
+def for_load(level: Level, queue_depth: int) -> Level:
+    """The level to actually search at with `queue_depth` searches queued."""
+    if queue_depth > DOWNGRADE_QUEUE and level.fallback is not None:
+        return LEVELS[level.fallback]
+    return level
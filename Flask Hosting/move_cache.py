@@ -0,0 +1,132 @@
+"""
+move_cache.py
+
+Bounded LRU cache of canonical position -> (best move, score), shared by the
+whole web tier and optionally persisted to disk between restarts.
+
+File layout (little endian):
+  header: magic b"C4MC", version (u16), record count (u64)
+  record: cpu_board (u64), player_board (u64), best_move (i8), score (i64)
+
+Scores are from the CPU's side; unknown (forced moves) and infinite scores
+are stored as sentinels.
+"""
+from __future__ import annotations
+
+import math
+import os
+import struct
+from collections import OrderedDict
+from threading import Lock
+
+
+MAGIC = b"C4MC"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHQ")
+RECORD = struct.Struct("<QQbq")
+
+NO_SCORE = -(2 ** 63)
+POS_INF = 2 ** 63 - 1
+NEG_INF = -(2 ** 63) + 1
+
+
+class MoveCacheError(Exception):
+    """Raised when a cache file is not a move cache or is truncated."""
+    pass
+
+
+def _encode_score(score):
+    if score is None:
+        return NO_SCORE
+    if score == math.inf:
+        return POS_INF
+    if score == -math.inf:
+        return NEG_INF
+    return int(score)
+
+
+def _decode_score(value):
+    if value == NO_SCORE:
+        return None
+    if value == POS_INF:
+        return math.inf
+    if value == NEG_INF:
+        return -math.inf
+    return value
+
+
+class MoveCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key):
+        """(move, score) for a canonical key, or None. Counts a hit or a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, move: int, score) -> None:
+        with self._lock:
+            self._entries[key] = (move, score)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "capacity": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def save(self, path: str) -> int:
+        """Writes the cache (least recently used first) via a temp file + rename. Returns the entry count."""
+        with self._lock:
+            items = list(self._entries.items())
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(HEADER.pack(MAGIC, VERSION, len(items)))
+            buf = bytearray()
+            for (cpu_board, player_board), (move, score) in items:
+                buf += RECORD.pack(cpu_board, player_board, move, _encode_score(score))
+            fh.write(buf)
+        os.replace(tmp, path)
+        return len(items)
+
+    def load(self, path: str) -> int:
+        """Adds the entries from a saved cache. Returns how many were read."""
+        with open(path, "rb") as fh:
+            raw = fh.read()
+        if len(raw) < HEADER.size:
+            raise MoveCacheError("Move cache file is missing its header")
+        magic, version, count = HEADER.unpack_from(raw, 0)
+        if magic != MAGIC:
+            raise MoveCacheError("Not a move cache file (bad magic)")
+        if version != VERSION:
+            raise MoveCacheError(f"Unsupported move cache version {version}")
+        if len(raw) != HEADER.size + count * RECORD.size:
+            raise MoveCacheError("Move cache file is truncated")
+
+        for cpu_board, player_board, move, score in RECORD.iter_unpack(memoryview(raw)[HEADER.size:]):
+            self.put((cpu_board, player_board), move, _decode_score(score))
+        return count
@@ -0,0 +1,95 @@
+"""
+opening_tree.py
+
+Precomputed CPU replies for the first few plies of a web game.
+
+The CPU always opens, so the tree is: the CPU's first move, every player
+reply to it, the CPU's answer to each of those, and so on down to
+REPLY_PLIES. It is built once when the server starts (or loaded from
+C4_REPLY_TREE) and then answers new games and resets without a search.
+The build searches every position at the default level with no time limit
+and outside admission control: an answer cut short by a request deadline or
+a load downgrade would otherwise be served to every new game for good.
+
+File format: JSON {"version": 2, "plies": n, "replies": [[cpu_board, player_board, col, score], ...]}
+with positions in canonical (mirror-folded) form.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+
+from board import ConnectFourBoard
+from levels import get_level
+
+
+REPLY_PLIES = int(os.environ.get("C4_REPLY_PLIES", 6))
+REPLY_TREE_FILE = os.environ.get("C4_REPLY_TREE")
+VERSION = 2  # 1 = trees built through the request path, possibly from cut-short searches
+
+
+def build_reply_tree(engine, plies: int = REPLY_PLIES) -> dict:
+    """Canonical position -> (col, score) for every CPU turn in the first `plies` plies."""
+    replies = {}
+    board = ConnectFourBoard()
+    level = get_level(None)
+
+    def walk():
+        ply = (board.cpu_board | board.player_board).bit_count()
+        if ply >= plies or board.is_full():
+            return
+        key, mirrored = engine.canonical(board)
+        if key in replies:
+            return
+
+        col, score, _ = engine.ai.search(ConnectFourBoard.from_bitboards(*key), level.max_depth, None,
+                                         level.node_limit, level.use_book)
+        replies[key] = (col, score)
+        board.make_move(6 - col if mirrored else col, 0)
+        if not board.check_winner(0):
+            for reply in board.get_valid_moves():
+                board.make_move(reply, 1)
+                if not board.check_winner(1):
+                    walk()
+                board.undo_move()
+        board.undo_move()
+
+    walk()
+    return replies
+
+
+def save_reply_tree(replies: dict, path: str, plies: int) -> None:
+    rows = []
+    for (cpu_board, player_board), (col, score) in replies.items():
+        # json has no infinity; unknown/infinite scores go out as null
+        if score is not None and math.isinf(score):
+            score = None
+        rows.append([cpu_board, player_board, col, score])
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump({"version": VERSION, "plies": plies, "replies": rows}, fh)
+    os.replace(tmp, path)
+
+
+def load_reply_tree(path: str, plies: int) -> dict | None:
+    """The saved tree, or None if it is missing, unreadable or built for a different depth."""
+    try:
+        with open(path, "r") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != VERSION or data.get("plies") != plies:
+        return None
+    return {(cpu_board, player_board): (col, score) for cpu_board, player_board, col, score in data["replies"]}
+
+
+def load_or_build(engine, plies: int = REPLY_PLIES, path: str | None = REPLY_TREE_FILE) -> dict:
+    if path:
+        replies = load_reply_tree(path, plies)
+        if replies is not None:
+            return replies
+    replies = build_reply_tree(engine, plies)
+    if path:
+        save_reply_tree(replies, path, plies)
+    return replies
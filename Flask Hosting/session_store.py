@@ -0,0 +1,119 @@
+"""
+session_store.py
+
+Bounded in-memory game store.
+
+Games idle for longer than the TTL are dropped, and once the store is full
+the least recently used game is evicted to make room. A daemon thread sweeps
+expired games in the background so idle visitors don't pin memory.
+"""
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
+from typing import Callable
+
+
+MAX_GAMES = int(os.environ.get("C4_MAX_GAMES", 10_000))
+GAME_TTL = float(os.environ.get("C4_GAME_TTL", 30 * 60))  # seconds idle before a game expires
+SWEEP_INTERVAL = float(os.environ.get("C4_SWEEP_INTERVAL", 60))
+
+
+class GameStore:
+    def __init__(self, max_games: int = MAX_GAMES, ttl_seconds: float = GAME_TTL):
+        self.max_games = max_games
+        self.ttl_seconds = ttl_seconds
+
+        # gid -> (game, last_seen); oldest access first
+        self._games: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self._sweeper: Thread | None = None
+
+        # capacity metrics
+        self.created = 0
+        self.evicted = 0  # dropped because the store was full
+        self.expired = 0  # dropped because they sat idle past the TTL
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def get(self, gid: str):
+        """Returns the game and marks it as recently used, or None if missing/expired."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._games.get(gid)
+            if item is None:
+                return None
+            game, last_seen = item
+            if now - last_seen > self.ttl_seconds:
+                del self._games[gid]
+                self.expired += 1
+                return None
+            self._games[gid] = (game, now)
+            self._games.move_to_end(gid)
+            return game
+
+    def put(self, gid: str, game) -> None:
+        with self._lock:
+            if gid not in self._games:
+                self.created += 1
+            self._games[gid] = (game, time.monotonic())
+            self._games.move_to_end(gid)
+            while len(self._games) > self.max_games:
+                self._games.popitem(last=False)
+                self.evicted += 1
+
+    def get_or_create(self, gid: str, factory: Callable):
+        game = self.get(gid)
+        if game is not None:
+            return game
+        # build outside the lock (it may ask the engine for a move)
+        game = factory()
+        with self._lock:
+            item = self._games.get(gid)
+        if item is not None:
+            # another request created it first
+            return item[0]
+        self.put(gid, game)
+        return game
+
+    def sweep(self) -> int:
+        """Drops every expired game. Returns how many were removed."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        removed = 0
+        with self._lock:
+            # oldest first, so stop at the first game that is still fresh
+            while self._games:
+                gid, (_, last_seen) = next(iter(self._games.items()))
+                if last_seen >= cutoff:
+                    break
+                del self._games[gid]
+                removed += 1
+            self.expired += removed
+        return removed
+
+    def start_sweeper(self, interval: float = SWEEP_INTERVAL) -> None:
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.sweep()
+
+        self._sweeper = Thread(target=run, name="game-store-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = len(self._games)
+        return {
+            "active": active,
+            "capacity": self.max_games,
+            "ttl_seconds": self.ttl_seconds,
+            "created": self.created,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
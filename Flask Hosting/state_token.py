@@ -0,0 +1,83 @@
+"""
+state_token.py
+
+Packs a web game into a small signed token so the client can carry its own
+state and any worker can serve any request.
+
+Payload (9 bytes): 49-bit position key (7 bytes, little endian) + move count (1 byte)
++ difficulty level id (1 byte, see levels.LEVEL_IDS).
+The position key is cpu_board + mask + bottom row: in every column the highest
+set bit marks the column height and the bits below it are the CPU's pieces,
+so the key alone is enough to rebuild both bitboards.
+
+Token: base64url(payload + first 12 bytes of HMAC-SHA256(payload)), 28 characters.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+
+from board import ConnectFourBoard
+
+
+TAG_BYTES = 12
+PAYLOAD_BYTES = 9
+BOTTOM = sum(1 << (col * 7) for col in range(7))
+
+
+def position_key(board: ConnectFourBoard) -> int:
+    mask = board.cpu_board | board.player_board
+    return board.cpu_board + mask + BOTTOM
+
+
+def board_from_key(key: int) -> ConnectFourBoard | None:
+    """Inverse of position_key(); None if the key can't be a real position."""
+    cpu_board = 0
+    player_board = 0
+    for col in range(7):
+        bits = (key >> (col * 7)) & 0x7F
+        height = bits.bit_length() - 1
+        if height < 0:
+            return None
+        col_mask = (1 << height) - 1
+        cpu_board |= (bits & col_mask) << (col * 7)
+        player_board |= (~bits & col_mask) << (col * 7)
+    if key >> 49:
+        return None
+    return ConnectFourBoard.from_bitboards(cpu_board, player_board)
+
+
+def _tag(payload: bytes, secret: bytes) -> bytes:
+    return hmac.new(secret, payload, hashlib.sha256).digest()[:TAG_BYTES]
+
+
+def encode(board: ConnectFourBoard, secret: bytes, level_id: int = 0) -> str:
+    ply = (board.cpu_board | board.player_board).bit_count()
+    payload = position_key(board).to_bytes(7, "little") + bytes([ply, level_id])
+    raw = payload + _tag(payload, secret)
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode(token: str, secret: bytes) -> tuple[ConnectFourBoard, int] | None:
+    """Returns (board, level id) for a valid token, None for anything forged, damaged or impossible."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        return None
+    if len(raw) != PAYLOAD_BYTES + TAG_BYTES:
+        return None
+
+    payload, tag = raw[:PAYLOAD_BYTES], raw[PAYLOAD_BYTES:]
+    if not hmac.compare_digest(tag, _tag(payload, secret)):
+        return None
+
+    board = board_from_key(int.from_bytes(payload[:7], "little"))
+    if board is None:
+        return None
+
+    # the CPU always moves first on the web, so it has the extra piece on odd plies
+    ply = payload[7]
+    if sum(board.heights) != ply or board.cpu_board.bit_count() != (ply + 1) // 2:
+        return None
+    return board, payload[8]
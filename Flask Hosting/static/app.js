@@ -2,23 +2,30 @@ const boardEl = document.getElementById("board");
 const overlayEl = document.getElementById("colOverlay");
 const statusEl = document.getElementById("status");
 const resetBtn = document.getElementById("resetBtn");
+const levelSelect = document.getElementById("levelSelect");
 
 let locked = false; // prevent double taps while CPU responds
+let lastState = null; // last state from the server, reused instead of re-fetching
 
 function setStatus(text) {
   statusEl.textContent = text;
 }
 
-function renderGrid(grid) {
+// bitboards use bit = col*7 + row (row 0 at the bottom); they fit in 49 bits,
+// so plain number math is exact (bitwise ops would truncate to 32 bits)
+function hasBit(bb, col, row) {
+  return Math.floor(bb / 2 ** (col * 7 + row)) % 2 === 1;
+}
+
+function renderGrid(cpu, player) {
   boardEl.innerHTML = "";
-  // grid is 6 rows x 7 cols, row 0 is top
-  for (let r = 0; r < 6; r++) {
+  // draw top row first
+  for (let r = 5; r >= 0; r--) {
     for (let c = 0; c < 7; c++) {
-      const v = grid[r][c];
       const cell = document.createElement("div");
       cell.className = "cell";
-      if (v === "X") cell.classList.add("player");
-      if (v === "O") cell.classList.add("cpu");
+      if (hasBit(player, c, r)) cell.classList.add("player");
+      if (hasBit(cpu, c, r)) cell.classList.add("cpu");
       boardEl.appendChild(cell);
     }
   }
@@ -54,13 +61,60 @@ function winnerText(winner) {
 }
 
 async function fetchState() {
+  // the browser revalidates with the ETag, so an unchanged board costs a 304
   const res = await fetch("/api/state");
   const data = await res.json();
+  if (res.status === 503) {
+    // engine overloaded: come back when the server says to
+    setStatus("Server is busy, retrying…");
+    await sleep(retryAfterMs(res));
+    return fetchState();
+  }
   updateFromState(data);
+  if (data.job) {
+    // CPU was mid-move (e.g. page reload): wait for it
+    locked = true;
+    setStatus("Thinking…");
+    renderOverlay([], null);
+    try {
+      await waitForJob(data.job);
+    } finally {
+      locked = false;
+    }
+  }
+}
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+const retryAfterMs = (res) => 1000 * (parseInt(res.headers.get("Retry-After"), 10) || 1);
+
+// Poll a background CPU move until the server returns the finished state
+async function waitForJob(jobId) {
+  let delay = 100;
+  for (;;) {
+    const res = await fetch(`/api/jobs/${jobId}`);
+    const data = await res.json();
+    if (res.status === 202) {
+      jobId = data.job || jobId;
+      await sleep(delay);
+      delay = Math.min(delay * 2, 1000);
+      continue;
+    }
+    if (res.status === 503) {
+      // the search was turned away under load; /api/state queues a fresh one
+      setStatus("Server is busy, retrying…");
+      await sleep(retryAfterMs(res));
+      return fetchState();
+    }
+    if (!res.ok) throw new Error(data.error || "Engine error");
+    updateFromState(data);
+    return data;
+  }
 }
 
 function updateFromState(data) {
-  renderGrid(data.grid);
+  lastState = data;
+  renderGrid(data.cpu, data.player);
+  if (data.level) levelSelect.value = data.level;
 
   const wtxt = winnerText(data.winner);
   if (wtxt) {
@@ -82,26 +136,36 @@ async function playMove(col) {
     const res = await fetch("/api/move", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ col })
+      body: JSON.stringify({ col, async: true })
     });
 
     const data = await res.json();
 
     if (!res.ok) {
-      setStatus(data.error || "Invalid move.");
+      // 503: the server is overloaded and did not keep the move
+      setStatus(res.status === 503 ? "Server is busy, try that move again in a moment." : (data.error || "Invalid move."));
       locked = false;
-      await fetchState();
+      // 409 means the CPU is still on its move: pick the state back up
+      if (res.status === 409) await fetchState();
+      else if (lastState) renderOverlay(lastState.valid_moves, lastState.winner);
       return;
     }
 
     updateFromState(data);
+
+    // 202: our piece is in, the CPU reply is computed in the background
+    if (res.status === 202 && data.job) {
+      setStatus("Thinking…");
+      renderOverlay([], null);
+      await waitForJob(data.job);
+    }
   } catch (e) {
     setStatus("Network error. Try again.");
     await fetchState();
   } finally {
     locked = false;
-    // re-render overlay in case it was disabled
-    await fetchState();
+    // re-enable the columns from the state we already have
+    if (lastState) renderOverlay(lastState.valid_moves, lastState.winner);
   }
 }
 
@@ -109,14 +173,23 @@ resetBtn.addEventListener("click", async () => {
   locked = true;
   setStatus("Resetting…");
   try {
-    const res = await fetch("/api/reset", { method: "POST" });
+    const res = await fetch("/api/reset", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ level: levelSelect.value })
+    });
     const data = await res.json();
     updateFromState(data);
+  } catch (e) {
+    setStatus("Network error. Try again.");
   } finally {
     locked = false;
-    await fetchState();
+    if (lastState) renderOverlay(lastState.valid_moves, lastState.winner);
   }
 });
 
+// a new difficulty starts a new game
+levelSelect.addEventListener("change", () => resetBtn.click());
+
 // initial load
 fetchState();
\ No newline at end of file
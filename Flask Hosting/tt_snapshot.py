@@ -0,0 +1,109 @@
+"""
+tt_snapshot.py
+
+Saves a MinMax transposition table to a compact binary file and reads it back,
+so solved positions survive restarts.
+
+Layout (little endian):
+  header: magic b"C4TT", version (u16), flags (u16), record count (u64), crc32 of records (u32)
+  record: cpu_board (u64), player_board (u64), to_move (u8), depth (u8), flag (u8),
+          best_move (i8), value (i64)
+
+Infinite values (every move loses) are stored as the i64 limits.
+"""
+import math
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b"C4TT"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHQI")
+RECORD = struct.Struct("<QQBBBbq")
+
+POS_INF = 2 ** 63 - 1
+NEG_INF = -(2 ** 63)
+
+CHUNK_RECORDS = 65536
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot has the wrong magic/version or fails its integrity check."""
+    pass
+
+
+def _encode_value(value):
+    if value == math.inf:
+        return POS_INF
+    if value == -math.inf:
+        return NEG_INF
+    return int(value)
+
+
+def _decode_value(value):
+    if value == POS_INF:
+        return math.inf
+    if value == NEG_INF:
+        return -math.inf
+    return value
+
+
+def save(tt, path, only_flag=None):
+    """
+    Writes `tt` (key -> (depth, flag, value, best_move)) to `path`.
+    only_flag limits the snapshot to one TT flag, e.g. MinMax.EXACT.
+    The file is written next to `path` and renamed over it, so a crash
+    never leaves a half written snapshot behind. Returns the record count.
+    """
+    tmp = path + ".tmp"
+    count = 0
+    crc = 0
+    buf = bytearray()
+    with open(tmp, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        # list() so other threads can keep writing to the TT while we save
+        for (cpu_board, player_board, to_move), (depth, flag, value, best_move) in list(tt.items()):
+            if only_flag is not None and flag != only_flag:
+                continue
+            buf += RECORD.pack(cpu_board, player_board, to_move, depth, flag, best_move,
+                               _encode_value(value))
+            count += 1
+            if count % CHUNK_RECORDS == 0:
+                crc = zlib.crc32(buf, crc)
+                fh.write(buf)
+                buf = bytearray()
+        crc = zlib.crc32(buf, crc)
+        fh.write(buf)
+        fh.seek(0)
+        fh.write(HEADER.pack(MAGIC, VERSION, 0, count, crc))
+    os.replace(tmp, path)
+    return count
+
+
+def load(path):
+    """Reads a snapshot (memory mapped) and returns it as a TT dict."""
+    with open(path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size < HEADER.size:
+            raise SnapshotError("Snapshot is missing its header")
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, _flags, count, crc = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise SnapshotError("Not a TT snapshot (bad magic)")
+            if version != VERSION:
+                raise SnapshotError(f"Unsupported snapshot version {version}")
+            if size != HEADER.size + count * RECORD.size:
+                raise SnapshotError("Snapshot size does not match its record count")
+
+            payload = memoryview(mm)[HEADER.size:]
+            try:
+                if zlib.crc32(payload) != crc:
+                    raise SnapshotError("Snapshot failed its checksum")
+                tt = {}
+                for cpu_board, player_board, to_move, depth, flag, best_move, value in RECORD.iter_unpack(payload):
+                    tt[(cpu_board, player_board, to_move)] = (depth, flag, _decode_value(value), best_move)
+            finally:
+                payload.release()
+    return tt
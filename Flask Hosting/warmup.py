@@ -0,0 +1,90 @@
+"""
+warmup.py
+
+Fills a fresh worker's TT and move cache before real users arrive.
+
+Starting from the CPU's opening, the warm-up walks the game tree breadth
+first: at each CPU turn it asks the engine for a move, then queues every
+player reply. Early, common positions come first, and it stops once the
+time budget is spent. A TT snapshot (C4_TT_SNAPSHOT) is loaded by
+EngineService itself, which makes this pass mostly TT hits.
+
+/api/ready answers 503 until the warm-up is finished, so a load balancer
+only sends traffic to warm workers.
+"""
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from threading import Thread
+
+from admission import EngineBusy
+from board import ConnectFourBoard
+
+
+WARMUP_SECONDS = float(os.environ.get("C4_WARMUP_SECONDS", 20))
+WARMUP_PLIES = int(os.environ.get("C4_WARMUP_PLIES", 12))
+# 1 = warm up before the app finishes importing (the worker only boots once warm)
+WARMUP_BLOCKING = os.environ.get("C4_WARMUP_BLOCKING") == "1"
+
+
+class Warmup:
+    def __init__(self, engine, budget_seconds: float = WARMUP_SECONDS, max_plies: int = WARMUP_PLIES):
+        self.engine = engine
+        self.budget_seconds = budget_seconds
+        self.max_plies = max_plies
+        self.ready = budget_seconds <= 0
+        self.positions = 0
+        self.seconds = 0.0
+        self._thread: Thread | None = None
+
+    def run(self) -> None:
+        start = time.monotonic()
+        deadline = start + self.budget_seconds
+        seen = set()
+        queue = deque([(0, 0)])  # (cpu_board, player_board) with the CPU to move
+
+        try:
+            while queue and time.monotonic() < deadline:
+                board = ConnectFourBoard.from_bitboards(*queue.popleft())
+                key, _ = self.engine.canonical(board)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                try:
+                    col, _ = self.engine.search(board)
+                except EngineBusy:
+                    break  # real traffic already has the engine busy; stop warming
+                self.positions += 1
+                board.make_move(col, 0)
+                if board.check_winner(0) or board.is_full():
+                    continue
+                if (board.cpu_board | board.player_board).bit_count() + 1 >= self.max_plies:
+                    continue
+                for reply in board.get_valid_moves():
+                    board.make_move(reply, 1)
+                    if not board.check_winner(1) and not board.is_full():
+                        queue.append((board.cpu_board, board.player_board))
+                    board.undo_move()
+        finally:
+            self.seconds = time.monotonic() - start
+            self.ready = True
+
+    def start(self, blocking: bool = WARMUP_BLOCKING) -> None:
+        if self.ready:
+            return
+        if blocking:
+            self.run()
+            return
+        self._thread = Thread(target=self.run, name="engine-warmup", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "positions": self.positions,
+            "seconds": round(self.seconds, 3),
+            "budget_seconds": self.budget_seconds,
+        }
@@ -0,0 +1,116 @@
+# backup_book.py
+"""
+Fills in every ply below the book horizon by backing up values with minimax.
+
+Starting one ply above the shallowest book ply and working down to the empty
+board, each position's children are looked up in the book (or in what was
+derived on the previous pass). A position gets an entry when all of its
+children are known, or when one known child is already a win for it.
+Derived entries carry the best move, so the engine answers them at the root.
+
+Usage:
+  python backup_book.py                          # opening_book.py -> opening_book.bin
+  python backup_book.py deep_book.bin full_book.bin
+"""
+import argparse
+
+from board import ConnectFourBoard, mirror_bitboard
+from book_format import BookWriter, NO_MOVE, load_book
+from generate_book import enumerate_positions
+
+
+def lookup(book, x_board, o_board):
+    """Book entry for the side to move (x), trying the mirror image too."""
+    entry = book.get((x_board, o_board))
+    if entry is not None:
+        return entry
+    entry = book.get((mirror_bitboard(x_board), mirror_bitboard(o_board)))
+    if entry is None:
+        return None
+    value, best_move, distance = entry
+    if best_move != NO_MOVE:
+        best_move = 6 - best_move
+    return value, best_move, distance
+
+
+def back_up(book, x_board, o_board):
+    """Minimax over the children of one position; None when the value can't be proven."""
+    board = ConnectFourBoard.from_bitboards(x_board, o_board)
+    wins, others = [], []
+    unknown = False
+    for col in sorted(board.get_valid_moves(), key=lambda c: abs(3 - c)):
+        board.make_move(col, 0)
+        if board.check_winner(0):
+            board.undo_move()
+            return 1, col, 1
+        if board.is_full():
+            child = (0, NO_MOVE, 0)
+        else:
+            child = lookup(book, board.player_board, board.cpu_board)
+        board.undo_move()
+
+        if child is None:
+            unknown = True
+            continue
+        # distance is only known if the child's distance was
+        entry = (-child[0], col, child[2] + 1 if child[2] else 0)
+        (wins if entry[0] > 0 else others).append(entry)
+
+    if wins:
+        # fastest win, out of the winning moves whose distance is known
+        timed = [w for w in wins if w[2]]
+        return min(timed, key=lambda w: w[2]) if timed else wins[0]
+    if unknown or not others:
+        return None
+    value = max(v for v, _, _ in others)
+    best = [o for o in others if o[0] == value]
+    if value < 0:
+        # every reply loses: the slowest loss is only known if every reply's distance is
+        if all(o[2] for o in others):
+            return max(best, key=lambda o: o[2])
+        return value, best[0][1], 0
+    return best[0]
+
+
+def load_legacy_book():
+    from opening_book import BOOK as LEGACY_BOOK
+    return {k: (v, NO_MOVE, 0) for k, v in LEGACY_BOOK.items()}
+
+
+def build(book):
+    """Returns {(x, o): entry} for every provable position below the book's shallowest ply."""
+    horizon = min((x | o).bit_count() for x, o in book)
+    derived = {}
+    for ply in range(horizon - 1, -1, -1):
+        found = 0
+        positions = enumerate_positions(ply)
+        for x_board, o_board in positions:
+            entry = back_up(book, x_board, o_board)
+            if entry is not None:
+                book[(x_board, o_board)] = entry
+                derived[(x_board, o_board)] = entry
+                found += 1
+        print(f"ply {ply}: {found}/{len(positions)} positions proven")
+    return derived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up book values to every ply below the book horizon.")
+    parser.add_argument("input", nargs="?", default=None, help="binary book (default: opening_book.py)")
+    parser.add_argument("output", nargs="?", default="opening_book.bin", help="binary book to write")
+    args = parser.parse_args()
+
+    book = load_book(args.input) if args.input else load_legacy_book()
+    source = dict(book)
+    derived = build(book)
+
+    with BookWriter(args.output) as out:
+        for (x_board, o_board), entry in source.items():
+            out.add(x_board, o_board, *entry)
+        for (x_board, o_board), entry in derived.items():
+            out.add(x_board, o_board, *entry)
+    print(f"Wrote {args.output} with {out.count} entries ({len(derived)} backed up).")
+
+
+if __name__ == "__main__":
+    main()
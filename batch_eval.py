@@ -0,0 +1,169 @@
+# batch_eval.py
+"""
+Batch position evaluation over a process pool, for game review, puzzle
+generation and anything else that needs thousands of positions scored.
+
+evaluate_many() shards the positions across worker processes. Each worker
+keeps one MinMax for its whole life, so its TT stays warm from one position
+to the next, and the opening book is loaded once per worker (at import,
+shared with the parent when the pool forks). Positions are sorted before
+they are cut into chunks, so the positions of one game (which share
+prefixes) mostly land on the same worker and reuse each other's TT entries.
+Results are yielded as chunks finish, not in input order; each carries the
+index of its position in the input.
+
+A position is a move string: the columns (0-6) played from the empty board,
+first player first. The side to move is evaluated, and scores are from its
+point of view: "result" is "win" / "loss" when the engine found a forced
+result (search or opening book), otherwise "score" is the heuristic value.
+
+Usage:
+  python batch_eval.py positions.txt --depth 8 --workers 8 --out results.jsonl
+  python batch_eval.py bench_positions.txt --all-moves --time 0.5
+Input lines may carry other fields (e.g. bench_positions.txt): the first
+all-digit token is the move string; blank lines and # comments are skipped.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing import Pool
+
+from board import ConnectFourBoard
+from CPUAlgorithm import MinMax, SearchStats
+
+
+@dataclass(frozen=True)
+class Budget:
+    """What each position may cost."""
+    max_depth: int | None = None  # default: MinMax.depth_max
+    time_limit: float | None = None  # seconds per position
+    node_limit: int | None = None  # nodes per position
+    use_book: bool = True
+    all_moves: bool = False  # score every column (MinMax.analyze) instead of just picking one
+
+
+def _score_fields(ai: MinMax, score) -> dict:
+    """{"score", "result"} for one engine score (side to move's view)."""
+    if score is None:
+        return {"score": None, "result": None}  # forced block, no search was run
+    limit = ai.BOOK_SCORE - 1000  # book and search wins/losses sit at or past this
+    if score >= limit:
+        return {"score": None, "result": "win"}
+    if score <= -limit:
+        return {"score": None, "result": "loss"}
+    return {"score": int(score), "result": None}
+
+
+# ---------- workers ----------
+_ai = None
+_budget = None
+
+
+def init_worker(budget: Budget):
+    global _ai, _budget
+    _ai = MinMax()
+    _budget = budget
+
+
+def evaluate_position(ai: MinMax, moves: str, budget: Budget) -> dict:
+    try:
+        board = ConnectFourBoard.from_moves(moves)
+    except ValueError as e:
+        return {"moves": moves, "error": str(e)}
+    if board.game_over():
+        return {"moves": moves, "error": "game is already over"}
+    if board.to_move() == 1:
+        board = board.flipped()  # the engine always searches as its CPU (player 0)
+
+    stats = SearchStats()
+    out = {"moves": moves}
+    if budget.all_moves:
+        scores, _ = ai.analyze(board, budget.max_depth, budget.time_limit, budget.node_limit, budget.use_book,
+                               stats=stats)
+        if scores:
+            best = max(scores, key=lambda col: (scores[col], -abs(col - 3)))
+            out.update(best=best, **_score_fields(ai, scores[best]))
+        else:
+            out.update(best=None, score=None, result=None)  # out of budget before depth 1
+        out["moves_scores"] = {str(col): _score_fields(ai, score) for col, score in sorted(scores.items())}
+    else:
+        col, score, _ = ai.search(board, budget.max_depth, budget.time_limit, budget.node_limit, budget.use_book,
+                               stats)
+        out.update(best=col, **_score_fields(ai, score))
+    out.update(depth=stats.depth, nodes=stats.nodes, seconds=round(stats.seconds, 4), source=stats.source)
+    return out
+
+
+def _evaluate_chunk(chunk: list[str]) -> list[dict]:
+    return [evaluate_position(_ai, moves, _budget) for moves in chunk]
+
+
+# ---------- driver ----------
+def evaluate_many(positions, budget: Budget = Budget(), workers: int | None = None, chunk_size: int = 32):
+    """
+    Evaluates every move string in `positions` on a pool of `workers` processes.
+    Yields one dict per position as soon as its chunk is done (not in input
+    order): moves, index, best, score, result, depth, nodes, seconds, source,
+    plus moves_scores with budget.all_moves, or just an error for a bad position.
+    Repeated positions are only searched once.
+    """
+    indices: dict[str, list[int]] = {}
+    for i, moves in enumerate(positions):
+        indices.setdefault(moves, []).append(i)
+
+    ordered = sorted(indices)
+    chunks = [ordered[i:i + chunk_size] for i in range(0, len(ordered), chunk_size)]
+    with Pool(workers, initializer=init_worker, initargs=(budget,)) as pool:
+        for results in pool.imap_unordered(_evaluate_chunk, chunks):
+            for result in results:
+                for index in indices[result["moves"]]:
+                    yield {"index": index, **result}
+
+
+def read_positions(path: str) -> list[str]:
+    fh = sys.stdin if path == "-" else open(path, "r")
+    positions = []
+    with fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            moves = next((t for t in line.split() if t.isdigit()), None)
+            if moves is not None:
+                positions.append(moves)
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate many positions on a process pool.")
+    parser.add_argument("positions", help="file with one move string per line, - for stdin")
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--time", type=float, default=None, help="seconds per position")
+    parser.add_argument("--nodes", type=int, default=None, help="nodes per position")
+    parser.add_argument("--no-book", action="store_true")
+    parser.add_argument("--all-moves", action="store_true", help="score every column, not just the best")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=32, help="positions per task sent to a worker")
+    parser.add_argument("--out", help="write JSON lines here (default: stdout)")
+    args = parser.parse_args()
+
+    positions = read_positions(args.positions)
+    budget = Budget(args.depth, args.time, args.nodes, not args.no_book, args.all_moves)
+    out = open(args.out, "w") if args.out else sys.stdout
+    start = time.perf_counter()
+    try:
+        for done, result in enumerate(evaluate_many(positions, budget, args.workers, args.chunk), 1):
+            out.write(json.dumps(result) + "\n")
+            if done % 1000 == 0 or done == len(positions):
+                seconds = time.perf_counter() - start
+                print(f"{done}/{len(positions)} positions, {seconds:.0f}s, {done / seconds:.1f}/s", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
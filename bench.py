@@ -0,0 +1,376 @@
+# bench.py
+"""
+Benchmark: MinMax against a fixed set of test positions with known results.
+
+bench_positions.txt holds the positions, grouped into sets by game phase
+(begin / middle / end) and difficulty (easy / hard), in the spirit of the
+usual Connect 4 solver test sets. Each line is
+
+  <set> <moves> <value> <best moves>
+
+moves: the columns (0-6) played from the empty board, first player first
+value: exact result for the side to move (1 win, 0 draw, -1 loss)
+best moves: every column that keeps that result, e.g. "2,3"
+
+For each position the engine plays the side to move. A position counts as
+correct when the engine picks one of the best moves. The runner reports
+mean/max time, nodes and NPS per set and writes everything as JSON, so two
+engine versions can be compared with --compare.
+
+Usage:
+  python bench.py                       # every set, engine defaults
+  python bench.py --sets end-easy,end-hard --depth 8 --out bench.json
+  python bench.py --compare old.json --out new.json
+  python bench.py --generate 10         # rebuild bench_positions.txt (slow, exact solver)
+
+The expected results come from Solver, a separate exact solver (bitboard
+negamax over win/draw/loss with the opening book for the first 8 plies),
+so the benchmark doesn't trust the engine it is checking.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import time
+
+from board import ConnectFourBoard, mirror_bitboard
+from CPUAlgorithm import BOOK, BOOK_PLIES, MinMax, SearchStats
+
+POSITIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_positions.txt")
+SETS = ("begin-easy", "begin-hard", "middle-easy", "middle-hard", "end-easy", "end-hard")
+# plies (pieces on the board) each phase is drawn from
+PHASE_PLIES = {"begin": (12, 16), "middle": (17, 24), "end": (25, 34)}
+
+# ---------- exact solver (used to generate the expected results) ----------
+HEIGHT = 6
+H1 = HEIGHT + 1
+BOTTOM = sum(1 << (col * H1) for col in range(7))
+FULL = BOTTOM * ((1 << HEIGHT) - 1)
+COLUMN_ORDER = (3, 2, 4, 1, 5, 0, 6)
+COLUMN_MASKS = [((1 << HEIGHT) - 1) << (col * H1) for col in range(7)]
+
+
+def winning_cells(pos, mask):
+    """Empty cells that would complete four for the player owning `pos`."""
+    # vertical
+    r = (pos << 1) & (pos << 2) & (pos << 3)
+    # horizontal and both diagonals
+    for shift in (H1, HEIGHT, HEIGHT + 2):
+        p = (pos << shift) & (pos << 2 * shift)
+        r |= p & (pos << 3 * shift)
+        r |= p & (pos >> shift)
+        p = (pos >> shift) & (pos >> 2 * shift)
+        r |= p & (pos << shift)
+        r |= p & (pos >> 3 * shift)
+    return r & (FULL ^ mask)
+
+
+def book_value(cur, opp):
+    entry = BOOK.get((cur, opp))
+    if entry is None:
+        entry = BOOK.get((mirror_bitboard(cur), mirror_bitboard(opp)))
+    return None if entry is None else entry[0]
+
+
+class SolverGaveUp(Exception):
+    """The position needed more nodes than the solver was allowed."""
+    pass
+
+
+class Solver:
+    """Weak (win/draw/loss) solver; `cur` is the side to move's pieces, `mask` all pieces."""
+
+    def __init__(self, max_nodes=None):
+        self.tt = {}
+        self.nodes = 0
+        self.max_nodes = max_nodes
+
+    def negamax(self, cur, mask, alpha, beta):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SolverGaveUp()
+        if mask == FULL:
+            return 0
+        possible = (mask + BOTTOM) & FULL
+        if winning_cells(cur, mask) & possible:
+            return 1
+
+        opp = cur ^ mask
+        threats = winning_cells(opp, mask)
+        forced = possible & threats
+        if forced:
+            if forced & (forced - 1):
+                return -1  # two threats to block at once
+            possible = forced
+        # don't play under a cell the opponent wins on
+        moves = possible & ~(threats >> 1)
+        if not moves:
+            return -1
+
+        if mask.bit_count() in BOOK_PLIES:
+            value = book_value(cur, opp)
+            if value is not None:
+                return value
+
+        key = cur + mask
+        lo, hi = self.tt.get(key, (-1, 1))
+        if lo >= beta:
+            return lo
+        if hi <= alpha:
+            return hi
+        alpha, beta = max(alpha, lo), min(beta, hi)
+        if alpha >= beta:
+            return alpha
+
+        alpha_orig = alpha
+        ordered = []
+        for col in COLUMN_ORDER:
+            move = moves & COLUMN_MASKS[col]
+            if move:
+                # try moves that set up the most threats first
+                score = (winning_cells(cur | move, mask | move)).bit_count()
+                ordered.append((-score, COLUMN_ORDER.index(col), move))
+        ordered.sort()
+
+        best = -1
+        for _, _, move in ordered:
+            value = -self.negamax(opp, mask | move, -beta, -alpha)
+            if value > best:
+                best = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        if best <= alpha_orig:
+            hi = best
+        elif best >= beta:
+            lo = best
+        else:
+            lo = hi = best
+        self.tt[key] = (lo, hi)
+        return best
+
+    def move_values(self, cur, mask):
+        """Exact value of every legal move for the side to move."""
+        values = {}
+        opp = cur ^ mask
+        for col in range(7):
+            if mask & COLUMN_MASKS[col] == COLUMN_MASKS[col]:
+                continue
+            move = (mask + BOTTOM) & COLUMN_MASKS[col]
+            if winning_cells(cur, mask) & move:
+                values[col] = 1
+            else:
+                values[col] = -self.negamax(opp, mask | move, -1, 1)
+        return values
+
+
+def position_from_moves(moves):
+    """(cur, mask) with `cur` the side to move's pieces."""
+    cur = mask = 0
+    for col in moves:
+        # the opponent's pieces become the side to move's once the move is in
+        cur ^= mask
+        mask |= (mask + BOTTOM) & COLUMN_MASKS[col]
+    return cur, mask
+
+
+# ---------- position set ----------
+def load_positions(path=POSITIONS_FILE, sets=None):
+    positions = []
+    with open(path, "r") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            name, moves, value, best = line.split()
+            if sets and name not in sets:
+                continue
+            positions.append({
+                "set": name,
+                "moves": moves,
+                "value": int(value),
+                "best": [int(c) for c in best.split(",")],
+            })
+    return positions
+
+
+def random_position(rng, ply):
+    """
+    Random game prefix of `ply` moves where nobody has won, the side to move
+    can't win on the spot and doesn't have to block one: MinMax answers those
+    from its win/block shortcut without searching, which says nothing about speed.
+    """
+    while True:
+        moves = []
+        cur = mask = 0
+        ok = True
+        for _ in range(ply):
+            possible = (mask + BOTTOM) & FULL
+            cols = [c for c in range(7) if possible & COLUMN_MASKS[c]]
+            col = rng.choice(cols)
+            move = possible & COLUMN_MASKS[col]
+            if winning_cells(cur, mask) & move:
+                ok = False
+                break
+            moves.append(col)
+            cur, mask = cur ^ mask, mask | move
+        possible = (mask + BOTTOM) & FULL
+        if ok and not (winning_cells(cur, mask) | winning_cells(cur ^ mask, mask)) & possible:
+            return "".join(map(str, moves))
+
+
+def generate(per_set, path=POSITIONS_FILE, seed=1, max_nodes=1_000_000):
+    """
+    Draws random positions for each phase, solves them exactly and keeps the
+    cheapest half as "easy" and the rest as "hard" (by solver nodes).
+    """
+    rng = random.Random(seed)
+    lines = []
+    for phase, (lo, hi) in PHASE_PLIES.items():
+        solved = []
+        seen = set()
+        while len(solved) < 2 * per_set:
+            moves = random_position(rng, rng.randint(lo, hi))
+            if moves in seen:
+                continue
+            seen.add(moves)
+            solver = Solver(max_nodes)
+            cur, mask = position_from_moves(map(int, moves))
+            start = time.perf_counter()
+            try:
+                values = solver.move_values(cur, mask)
+            except SolverGaveUp:
+                continue
+            value = max(values.values())
+            best = [c for c, v in sorted(values.items()) if v == value]
+            if len(best) == len(values):
+                continue  # every move is as good: tells us nothing
+            solved.append((solver.nodes, moves, value, best))
+            print(f"{phase}: {len(solved)}/{2 * per_set} solved ({solver.nodes} nodes, "
+                  f"{time.perf_counter() - start:.1f}s)")
+        solved.sort()
+        for i, (_, moves, value, best) in enumerate(solved):
+            name = f"{phase}-{'easy' if i < per_set else 'hard'}"
+            lines.append(f"{name} {moves} {value} {','.join(map(str, best))}")
+
+    with open(path, "w") as fh:
+        fh.write("# <set> <moves> <value for side to move> <best moves>  (see bench.py)\n")
+        fh.write("\n".join(lines) + "\n")
+    return len(lines)
+
+
+# ---------- runner ----------
+def run(positions, depth=None, time_limit=None):
+    ai = MinMax()
+    results = []
+    for pos in positions:
+        board = ConnectFourBoard.from_moves(pos["moves"])
+        if board.to_move() == 1:
+            board = board.flipped()  # the engine always searches as its CPU (player 0)
+        ai.tt.clear()  # every position starts cold
+        stats = SearchStats()
+        col, score, _ = ai.search(board, depth, time_limit, stats=stats)
+        results.append({
+            **pos,
+            "move": col,
+            "score": None if score is None or (isinstance(score, float) and math.isinf(score)) else score,
+            "correct": col in pos["best"],
+            "seconds": stats.seconds,
+            "nodes": stats.nodes,
+            "depth": stats.depth,
+            "source": stats.source,
+        })
+    return results
+
+
+def summarize(results):
+    by_set = {}
+    for r in results:
+        by_set.setdefault(r["set"], []).append(r)
+
+    summary = {}
+    for name in sorted(by_set, key=lambda s: SETS.index(s) if s in SETS else len(SETS)):
+        rows = by_set[name]
+        seconds = [r["seconds"] for r in rows]
+        nodes = sum(r["nodes"] for r in rows)
+        summary[name] = {
+            "positions": len(rows),
+            "correct": sum(r["correct"] for r in rows),
+            "accuracy": sum(r["correct"] for r in rows) / len(rows),
+            "mean_seconds": statistics.fmean(seconds),
+            "max_seconds": max(seconds),
+            "mean_nodes": nodes / len(rows),
+            "nps": nodes / sum(seconds) if sum(seconds) > 0 else 0.0,
+        }
+    return summary
+
+
+def compare(old, new):
+    """Prints per-set changes against an earlier result file."""
+    print(f"{'set':<12} {'time old':>9} {'time new':>9} {'ratio':>6} {'acc old':>8} {'acc new':>8}")
+    for name, cur in new["summary"].items():
+        prev = old["summary"].get(name)
+        if prev is None:
+            continue
+        ratio = cur["mean_seconds"] / prev["mean_seconds"] if prev["mean_seconds"] else math.inf
+        flag = ""
+        if cur["accuracy"] < prev["accuracy"]:
+            flag = "  <-- fewer correct"
+        elif ratio > 1.10:
+            flag = "  <-- slower"
+        print(f"{name:<12} {prev['mean_seconds']:>9.3f} {cur['mean_seconds']:>9.3f} {ratio:>6.2f} "
+              f"{prev['accuracy']:>8.1%} {cur['accuracy']:>8.1%}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MinMax on positions with known results.")
+    parser.add_argument("--sets", help="comma separated set names (default: all)")
+    parser.add_argument("--depth", type=int, default=None, help="search depth (default: engine default)")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds per position")
+    parser.add_argument("--positions", default=POSITIONS_FILE, help="position file")
+    parser.add_argument("--out", help="write the JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--generate", type=int, metavar="N", help="rebuild the position file with N positions per set")
+    args = parser.parse_args()
+
+    if args.generate:
+        count = generate(args.generate, args.positions)
+        print(f"Wrote {count} positions to {args.positions}")
+        return
+
+    sets = set(args.sets.split(",")) if args.sets else None
+    positions = load_positions(args.positions, sets)
+    if not positions:
+        parser.error("no positions selected")
+
+    results = run(positions, args.depth, args.time_limit)
+    report = {
+        "engine": {"depth": args.depth or MinMax.depth_max, "time_limit": args.time_limit},
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "summary": summarize(results),
+        "positions": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+        for name, row in report["summary"].items():
+            print(f"{name:<12} {row['correct']}/{row['positions']} correct, mean {row['mean_seconds']:.3f}s, "
+                  f"max {row['max_seconds']:.3f}s, {row['mean_nodes']:.0f} nodes, {row['nps']:.0f} nps")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r") as fh:
+            compare(json.load(fh), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+book_format.py
+
+Compact binary opening book format shared by the converter, the offline
+book tools and the engine.
+
+Layout (little endian):
+  header: magic b"C4BK", version (u16), flags (u16), record count (u64)
+  record: x_board (u64), o_board (u64), value (i8), best_move (i8), distance (u8)
+
+x_board is always the side to move. value is +1 / 0 / -1 for the side to move,
+best_move is a column or NO_MOVE, distance is plies until the game is decided
+(0 = unknown).
+"""
+import struct
+
+MAGIC = b"C4BK"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHQ")
+RECORD = struct.Struct("<QQbbB")
+
+NO_MOVE = -1
+CHUNK_RECORDS = 65536  # records buffered per read/write
+
+
+class BookFormatError(Exception):
+    """Raised when a book file is missing its header or is truncated."""
+    pass
+
+
+class BookWriter:
+    """
+    Streams records to a binary book file in fixed size chunks.
+    The record count is patched into the header on close, so memory use
+    does not depend on how many positions are written.
+    """
+
+    def __init__(self, path, chunk_records=CHUNK_RECORDS):
+        self.path = path
+        self.chunk_records = chunk_records
+        self.count = 0
+        self._buf = bytearray()
+        self._pending = 0
+        self._fh = open(path, "wb")
+        self._fh.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+
+    def add(self, x_board, o_board, value, best_move=NO_MOVE, distance=0):
+        self._buf += RECORD.pack(x_board, o_board, value, best_move, distance)
+        self._pending += 1
+        self.count += 1
+        if self._pending >= self.chunk_records:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._fh.write(self._buf)
+            self._buf = bytearray()
+            self._pending = 0
+
+    def close(self):
+        if self._fh is None:
+            return
+        self.flush()
+        # go back and fill in the real record count
+        self._fh.seek(0)
+        self._fh.write(HEADER.pack(MAGIC, VERSION, 0, self.count))
+        self._fh.close()
+        self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_header(fh):
+    raw = fh.read(HEADER.size)
+    if len(raw) != HEADER.size:
+        raise BookFormatError("Book file is missing its header")
+    magic, version, _flags, count = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise BookFormatError("Not a book file (bad magic)")
+    if version != VERSION:
+        raise BookFormatError(f"Unsupported book version {version}")
+    return count
+
+
+def iter_records(path, chunk_records=CHUNK_RECORDS):
+    """Yields (x_board, o_board, value, best_move, distance) one record at a time."""
+    with open(path, "rb") as fh:
+        remaining = read_header(fh)
+        while remaining:
+            n = min(remaining, chunk_records)
+            raw = fh.read(n * RECORD.size)
+            if len(raw) != n * RECORD.size:
+                raise BookFormatError("Book file is truncated")
+            yield from RECORD.iter_unpack(raw)
+            remaining -= n
+
+
+def load_book(path):
+    """Loads a whole book into a dict: (x_board, o_board) -> (value, best_move, distance)."""
+    return {(x, o): (v, m, d) for x, o, v, m, d in iter_records(path)}
@@ -1,10 +1,26 @@
 # convert_opening_book.py
-from pathlib import Path
+"""
+Streams a text opening book into the binary format from book_format.py.
 
-IN_FILE = r"c:\Users\13mic\Downloads\connect+4\connect-4.data\connect-4.data"
-OUT_FILE = "opening_book.py"
+Usage:
+  python convert_opening_book.py connect-4.data opening_book.bin
+  python convert_opening_book.py solved.txt.gz opening_book.bin
+
+Accepted input lines (mixed freely, anything else is skipped):
+  - UCI connect-4.data rows: 42 cells ('x', 'o', 'b') + win/draw/loss
+  - solver rows: x_board,o_board,value[,best_move[,distance]]
+
+Input is read one line at a time and written in chunks, so memory use stays
+flat no matter how big the source is. Files ending in .gz are read as gzip.
+"""
+import argparse
+import gzip
+
+from book_format import BookWriter, CHUNK_RECORDS, NO_MOVE
 
 RESULT_MAP = {"win": 1, "draw": 0, "loss": -1}
+# the 42 playable bits (bit = col*7 + row, rows 0-5); a board outside these can't be packed or looked up
+BOARD_MASK = sum(0x3F << (col * 7) for col in range(7))
 
 def encode_bitboards(cells_42):
     """
@@ -27,33 +43,61 @@ def encode_bitboards(cells_42):
                 o_board |= bit
     return x_board, o_board
 
-def main():
-    lines = Path(IN_FILE).read_text().splitlines()
-
-    # Write as a dict literal in a .py for fast import
-    out = []
-    out.append("# Auto-generated from connect-4.data\n")
-    out.append("OPENING_PLY = 8\n")
-    out.append("BOOK = {\n")
-
-    count = 0
-    for line in lines:
-        parts = line.strip().split(",")
-        if len(parts) != 43:
-            continue
-        cells = parts[:42]
+def parse_line(line):
+    """Returns (x_board, o_board, value, best_move, distance) or None if the line is not a record."""
+    parts = line.strip().split(",")
+
+    # UCI row
+    if len(parts) == 43:
         result = parts[42].strip().lower()
         if result not in RESULT_MAP:
-            continue
-        x_board, o_board = encode_bitboards(cells)
-        out.append(f"    ({x_board}, {o_board}): {RESULT_MAP[result]},\n")
-        count += 1
+            return None
+        x_board, o_board = encode_bitboards(parts[:42])
+        return x_board, o_board, RESULT_MAP[result], NO_MOVE, 0
 
-    out.append("}\n")
-    out.append(f"SIZE = {count}\n")
+    # solver row
+    if 3 <= len(parts) <= 5:
+        try:
+            fields = [int(p) for p in parts]
+        except ValueError:
+            return None
+        fields += [NO_MOVE, 0][len(fields) - 3:]
+        x_board, o_board, value, best_move, distance = fields
+        if x_board < 0 or o_board < 0 or (x_board | o_board) & ~BOARD_MASK or x_board & o_board:
+            return None
+        if value not in (-1, 0, 1) or not (NO_MOVE <= best_move <= 6) or not (0 <= distance <= 42):
+            return None
+        return x_board, o_board, value, best_move, distance
+
+    return None
+
+def open_text(path, force_gzip=False):
+    if force_gzip or str(path).endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+def convert(in_file, out_file, force_gzip=False, chunk_records=CHUNK_RECORDS):
+    skipped = 0
+    with open_text(in_file, force_gzip) as src, BookWriter(out_file, chunk_records) as out:
+        for line in src:
+            rec = parse_line(line)
+            if rec is None:
+                if line.strip():
+                    skipped += 1
+                continue
+            out.add(*rec)
+    return out.count, skipped
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a text opening book to the binary book format.")
+    parser.add_argument("input", help="connect-4.data or solver output (.gz is read as gzip)")
+    parser.add_argument("output", help="binary book to write, e.g. opening_book.bin")
+    parser.add_argument("--gzip", action="store_true", help="treat input as gzip even without a .gz suffix")
+    parser.add_argument("--chunk", type=int, default=CHUNK_RECORDS, help="records buffered per write")
+    args = parser.parse_args()
 
-    Path(OUT_FILE).write_text("".join(out))
-    print(f"Wrote {OUT_FILE} with {count} entries.")
+    count, skipped = convert(args.input, args.output, args.gzip, args.chunk)
+    print(f"Wrote {args.output} with {count} entries ({skipped} lines skipped).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,199 @@
+# engine_protocol.py
+"""
+Headless text protocol for the engine over stdin/stdout, so GUIs and test
+harnesses can drive MinMax in one long-lived process (the TT stays warm
+between moves) instead of starting game.py each time.
+
+One command per line:
+  isready                     -> readyok
+  newgame                     forget the TT
+  position [startpos] [moves] <move string>
+                              e.g. "position 3342" or "position startpos moves 3342";
+                              columns 0-6, first player first. The side to move is the engine.
+                              A bad move string clears the position: go fails until the next good one.
+  go [depth N] [movetime MS] [nodes N] [nobook]
+                              search the current position
+  stop                        end the running search now (its best move is still reported),
+                              along with any go sent before the stop that hasn't started yet
+  quit
+
+Commands run one after the other in the order they were sent, so a harness
+can pipe a whole script in without waiting for bestmove: a command that
+arrives during a search waits for it to finish (isready answers once
+everything sent before it is done). Only stop acts at once. quit, and the
+end of the input, let the commands already sent finish before the process exits.
+
+While searching the engine prints, after every finished depth:
+  info depth D score cp X|win|loss nodes N time MS nps N pv C C C ...
+and when the search ends:
+  bestmove C                  (or "bestmove none" when the game is over or there is no position)
+win / loss are forced results for the engine (from the search or the opening
+book); cp is the heuristic evaluation. Problems come back as "info string error ...".
+
+Usage:
+  python engine_protocol.py
+  printf 'position 33422156\\ngo depth 10\\nquit\\n' | python engine_protocol.py
+"""
+import queue
+import sys
+import threading
+import time
+
+from board import ConnectFourBoard
+from CPUAlgorithm import MinMax, SearchStats
+
+
+class EngineProtocol:
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.ai = MinMax()
+        self.moves = ""  # None after a bad position command
+        self.commands = queue.Queue()
+        self.pending_stops = []  # one Event per go that was sent and hasn't finished yet
+        self._stops_lock = threading.Lock()
+        self._out_lock = threading.Lock()
+
+    def send(self, line):
+        with self._out_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def error(self, message):
+        self.send(f"info string error {message}")
+
+    # ---------- input ----------
+    def loop(self, lines=sys.stdin):
+        worker = threading.Thread(target=self._work, daemon=True)
+        worker.start()
+        for line in lines:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == "quit":
+                break
+            if tokens[0] == "stop":
+                with self._stops_lock:
+                    for stop in self.pending_stops:
+                        stop.set()
+                continue
+            stop = None
+            if tokens[0] == "go":
+                stop = threading.Event()
+                with self._stops_lock:
+                    self.pending_stops.append(stop)
+            self.commands.put((tokens, stop))
+        # quit or end of input: finish what was already sent first
+        self.commands.put(None)
+        worker.join()
+
+    def _work(self):
+        while True:
+            item = self.commands.get()
+            if item is None:
+                return
+            tokens, stop = item
+            try:
+                self.handle(tokens[0], tokens[1:], stop)
+            except Exception as e:  # keep the process alive for the next command
+                self.error(f"{tokens[0]} failed: {e}")
+            finally:
+                if stop is not None:
+                    with self._stops_lock:
+                        self.pending_stops.remove(stop)
+
+    # ---------- commands ----------
+    def handle(self, cmd, args, stop=None):
+        if cmd == "isready":
+            self.send("readyok")
+        elif cmd == "newgame":
+            self.ai.tt.clear()
+            self.moves = ""
+        elif cmd == "position":
+            self.position(args)
+        elif cmd == "go":
+            self.go(args, stop or threading.Event())
+        else:
+            self.error(f"unknown command '{cmd}'")
+
+    def position(self, args):
+        moves = "".join(t for t in args if t not in ("startpos", "moves"))
+        try:
+            ConnectFourBoard.from_moves(moves)
+        except ValueError as e:
+            # don't leave the previous position in place: a go after this would search the wrong game
+            self.moves = None
+            self.error(str(e))
+            return
+        self.moves = moves
+
+    def go(self, args, stop):
+        limits = {"depth": None, "movetime": None, "nodes": None}
+        use_book = True
+        i = 0
+        while i < len(args):
+            name = args[i]
+            if name == "nobook":
+                use_book = False
+                i += 1
+            elif name in limits and i + 1 < len(args) and args[i + 1].isdigit():
+                limits[name] = int(args[i + 1])
+                i += 2
+            else:
+                self.error(f"bad go argument '{name}'")
+                self.send("bestmove none")
+                return
+
+        if self.moves is None:
+            self.error("no valid position, send position again")
+            self.send("bestmove none")
+            return
+        board = ConnectFourBoard.from_moves(self.moves)
+        if board.game_over():
+            self.send("bestmove none")
+            return
+        # the engine always searches as its CPU (player 0)
+        view = board.flipped() if board.to_move() == 1 else board
+        time_limit = limits["movetime"] / 1000 if limits["movetime"] is not None else None
+        self._search(view, limits["depth"], time_limit, limits["nodes"], use_book, stop)
+
+    def _search(self, view, max_depth, time_limit, node_limit, use_book, stop):
+        start = time.perf_counter()
+
+        def on_depth(depth, col, score, nodes):
+            ms = int((time.perf_counter() - start) * 1000)
+            nps = int(nodes / (ms / 1000)) if ms > 0 else 0
+            pv = " ".join(map(str, self.ai.principal_variation(view, col)))
+            self.send(f"info depth {depth} score {self.format_score(score)} "
+                      f"nodes {nodes} time {ms} nps {nps} pv {pv}")
+
+        stats = SearchStats()
+        try:
+            col, score, _ = self.ai.search(view, max_depth, time_limit, node_limit, use_book, stats,
+                                           stop=stop, on_depth=on_depth)
+        except Exception as e:
+            self.error(f"search failed: {e}")
+            self.send("bestmove none")
+            return
+        if stats.source in ("book", "win", "block"):
+            # answered without a search, so no depth lines went out
+            line = f"info string {stats.source}"
+            if score is not None:
+                line += f" score {self.format_score(score)}"
+            self.send(f"{line} pv {col}")
+        self.send(f"bestmove {col}")
+
+    def format_score(self, score):
+        # book results sit at +-BOOK_SCORE, search wins at MATE_SCORE and up (or inf when every reply loses)
+        if score >= self.ai.BOOK_SCORE - 1000:
+            return "win"
+        if score <= -(self.ai.BOOK_SCORE - 1000):
+            return "loss"
+        return f"cp {int(score)}"
+
+
+def main():
+    EngineProtocol().loop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# generate_book.py
+"""
+Offline book generation.
+
+Enumerates every position at a given ply (mirror images folded together),
+searches each one with MinMax across a process pool and writes a binary book
+(book_format.py) with the values, best moves and distance to the result.
+
+By default each position gets a depth-limited search (--depth, default 8),
+and only the results it proves (forced wins and losses) go into the book;
+the engine keeps searching the rest. --exact solves to the end of the game
+instead, which is only practical for a few late positions: MinMax runs at
+roughly 10k nodes/s, and one ply 12 position did not finish in 200s.
+
+What is feasible: a depth 8 search takes about 1.5s per ply 9 position on one
+core, and ply 9 has 269,531 positions (ply 8: 91,295; each ply is about 3x
+the one before), so a full ply 9 run is around 110 core-hours. Ply 9 is the
+deepest full ply worth running (the opening book already covers ply 8 and
+below); for deeper plies use --limit to solve a fixed sample.
+
+Usage:
+  python generate_book.py --ply 9 --workers 16
+  python generate_book.py --ply 10 --limit 20000 --out deep_book.bin
+
+Solved positions are appended to a checkpoint file as they finish
+(<out>.ckpt by default). Running the same command again skips everything
+already in the checkpoint, so a long run can be stopped and resumed.
+The checkpoint uses the solver row format convert_opening_book.py reads.
+"""
+import argparse
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from board import ConnectFourBoard, mirror_bitboard
+from CPUAlgorithm import MinMax
+from book_format import NO_MOVE
+from convert_opening_book import convert
+
+# one engine per worker process, so each worker keeps a warm TT between positions
+_ai = None
+
+DEFAULT_PLY = 9
+DEFAULT_DEPTH = 8
+
+
+def canonical(x_board: int, o_board: int):
+    """Smaller of the position and its mirror image, so both share one book entry."""
+    return min((x_board, o_board), (mirror_bitboard(x_board), mirror_bitboard(o_board)))
+
+
+def enumerate_positions(ply: int):
+    """
+    Returns the set of canonical (x_board, o_board) positions at `ply`
+    where nobody has won yet. x_board is the side to move.
+    Works one ply at a time so only two levels are ever held in memory.
+    """
+    level = {(0, 0)}
+    for _ in range(ply):
+        nxt = set()
+        for x_board, o_board in level:
+            # side to move is x; after its move the roles swap
+            board = ConnectFourBoard.from_bitboards(x_board, o_board)
+            for col in board.get_valid_moves():
+                board.make_move(col, 0)
+                if not board.check_winner(0) and not board.is_full():
+                    nxt.add(canonical(board.player_board, board.cpu_board))
+                board.undo_move()
+        level = nxt
+    return level
+
+
+def init_worker():
+    global _ai
+    _ai = MinMax()
+
+
+def solve_position(args):
+    """
+    Solves one position with the side to move playing as the CPU.
+    Returns (x_board, o_board, value, best_move, distance); value is None
+    when a depth-limited search could not prove the result.
+    """
+    x_board, o_board, depth = args
+    ai = _ai
+    if len(ai.tt) > ai.tt_max_entries:
+        ai.tt.clear()
+    board = ConnectFourBoard.from_bitboards(x_board, o_board)
+    empties = 42 - (x_board | o_board).bit_count()
+    exact = depth is None or depth >= empties
+    d = empties if exact else depth
+
+    alpha, beta = -math.inf, math.inf
+    best_move = NO_MOVE
+    best_score = -math.inf
+    for col in sorted(board.get_valid_moves(), key=lambda c: abs(3 - c)):
+        board.make_move(col, ai.CPU)
+        if board.check_winner(ai.CPU):
+            score = ai.MATE_SCORE + d
+        else:
+            score = -ai.negamax(board, d - 1, -beta, -alpha, ai.PLAYER)
+        board.undo_move()
+
+        if score > best_score or best_move == NO_MOVE:
+            best_score = score
+            best_move = col
+        alpha = max(alpha, best_score)
+
+    # mate scores are MATE_SCORE + remaining depth where the game ends, book hits are +-BOOK_SCORE
+    distance = 0
+    if best_score >= ai.BOOK_SCORE:
+        value = 1
+        if exact and ai.MATE_SCORE <= best_score < math.inf:
+            distance = d + 1 - (best_score - ai.MATE_SCORE)
+    elif best_score <= -ai.BOOK_SCORE:
+        value = -1
+        if exact and -math.inf < best_score <= -ai.MATE_SCORE:
+            distance = d + 1 - (-best_score - ai.MATE_SCORE)
+    elif exact:
+        value = 0
+    else:
+        value = None
+
+    return x_board, o_board, value, best_move, distance
+
+
+def read_checkpoint(path):
+    """Keys already handled by an earlier run (unproven positions included)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r") as fh:
+        for line in fh:
+            parts = line.strip().split(",")
+            if len(parts) >= 3:
+                try:
+                    done.add((int(parts[0]), int(parts[1])))
+                except ValueError:
+                    continue
+    return done
+
+
+def generate(ply, out_file, checkpoint, workers=None, depth=DEFAULT_DEPTH, limit=None, chunksize=16,
+             flush_every=256):
+    """depth=None solves every position to the end of the game; limit solves a fixed sample."""
+    print(f"Enumerating positions at ply {ply}...")
+    positions = sorted(enumerate_positions(ply))
+    if limit is not None and limit < len(positions):
+        # same seed every run, so a resumed run picks the same sample
+        positions = sorted(random.Random(ply).sample(positions, limit))
+    done = read_checkpoint(checkpoint)
+    todo = [(x, o, depth) for x, o in positions if (x, o) not in done]
+    print(f"{len(positions)} positions, {len(positions) - len(todo)} already in {checkpoint}, {len(todo)} to solve.")
+
+    start = time.perf_counter()
+    solved = 0
+    with open(checkpoint, "a") as ckpt, Pool(workers, initializer=init_worker) as pool:
+        for x_board, o_board, value, best_move, distance in pool.imap_unordered(solve_position, todo, chunksize):
+            # unproven positions are still recorded so a resume does not retry them
+            if value is None:
+                ckpt.write(f"{x_board},{o_board},?\n")
+            else:
+                ckpt.write(f"{x_board},{o_board},{value},{best_move},{distance}\n")
+            solved += 1
+            if solved % flush_every == 0:
+                ckpt.flush()
+                rate = solved / (time.perf_counter() - start)
+                print(f"  {solved}/{len(todo)} solved ({rate:.1f} positions/s)")
+
+    count, skipped = convert(checkpoint, out_file)
+    print(f"Wrote {out_file} with {count} entries ({skipped} unproven).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search every position at a ply and write a binary book.")
+    parser.add_argument("--ply", type=int, default=DEFAULT_PLY, help=f"ply to enumerate (default {DEFAULT_PLY})")
+    parser.add_argument("--out", default="deep_book.bin", help="binary book to write")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default <out>.ckpt)")
+    parser.add_argument("--workers", type=int, default=None, help="solver processes (default: all cores)")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH,
+                        help=f"search depth per position (default {DEFAULT_DEPTH}); only proven results are kept")
+    parser.add_argument("--exact", action="store_true",
+                        help="solve every position to the end of the game (only practical late in the game)")
+    parser.add_argument("--limit", type=int, default=None, help="solve a fixed random sample of this many positions")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or args.out + ".ckpt"
+    generate(args.ply, args.out, checkpoint, args.workers, None if args.exact else args.depth, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# perft.py
+"""
+Perft: counts the leaf nodes of the full game tree to a fixed depth using
+only ConnectFourBoard (make_move / undo_move / get_valid_moves / check_winner).
+
+A winning move (or the move that fills the board) ends its line: it is
+counted as a leaf and not expanded. Nothing here touches the search or the
+evaluation, so the node rate is pure move-generation throughput, and the
+counts for the empty board must match REFERENCE exactly; any difference
+means the board representation is broken.
+
+Usage:
+  python perft.py 8             # empty board, checked against REFERENCE
+  python perft.py 6 --moves 3342 --divide
+  python perft.py 9 --check     # every depth up to 9, exit code 1 on a mismatch
+"""
+import argparse
+import sys
+import time
+
+from board import ConnectFourBoard
+
+# leaf counts from the empty board (computed with an independent bitboard counter)
+REFERENCE = {
+    1: 7,
+    2: 49,
+    3: 343,
+    4: 2401,
+    5: 16807,
+    6: 117649,
+    7: 823536,
+    8: 5686266,
+    9: 39452034,
+    10: 269175990,
+    11: 1849996230,
+    12: 12490984398,
+}
+
+
+def perft(board: ConnectFourBoard, depth: int, turn: int) -> int:
+    if depth == 0:
+        return 1
+    nodes = 0
+    for col in board.get_valid_moves():
+        board.make_move(col, turn)
+        if depth == 1 or board.check_winner(turn) or board.is_full():
+            nodes += 1
+        else:
+            nodes += perft(board, depth - 1, 1 - turn)
+        board.undo_move()
+    return nodes
+
+
+def divide(board: ConnectFourBoard, depth: int, turn: int) -> dict:
+    """Leaf count below each first move, for tracking down a wrong total."""
+    counts = {}
+    for col in board.get_valid_moves():
+        board.make_move(col, turn)
+        if depth == 1 or board.check_winner(turn) or board.is_full():
+            counts[col] = 1
+        else:
+            counts[col] = perft(board, depth - 1, 1 - turn)
+        board.undo_move()
+    return counts
+
+
+def run(depth: int, moves: str = "", show_divide: bool = False) -> bool:
+    """Prints the count and rate for one depth. Returns False on a reference mismatch."""
+    board = ConnectFourBoard.from_moves(moves)
+    if board.game_over():
+        raise ValueError(f"Game is already over after {moves}")
+    turn = board.to_move()
+    start = time.perf_counter()
+    if show_divide:
+        counts = divide(board, depth, turn)
+        for col, n in counts.items():
+            print(f"  {col}: {n}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, depth, turn)
+    seconds = time.perf_counter() - start
+
+    rate = nodes / seconds if seconds > 0 else 0.0
+    line = f"perft({depth}) = {nodes}  {seconds:.3f}s  {rate:,.0f} nodes/s"
+    ok = True
+    if not moves and depth in REFERENCE:
+        ok = nodes == REFERENCE[depth]
+        line += "  OK" if ok else f"  MISMATCH (expected {REFERENCE[depth]})"
+    print(line)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count leaf nodes of the game tree to a fixed depth.")
+    parser.add_argument("depth", type=int)
+    parser.add_argument("--moves", default="", help="start position as a move string, e.g. 3342")
+    parser.add_argument("--divide", action="store_true", help="show the count below each first move")
+    parser.add_argument("--check", action="store_true", help="run every depth from 1 up to DEPTH")
+    args = parser.parse_args()
+
+    depths = range(1, args.depth + 1) if args.check else [args.depth]
+    ok = True
+    try:
+        for depth in depths:
+            ok = run(depth, args.moves, args.divide) and ok
+    except ValueError as e:
+        parser.error(str(e))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+profiler.py
+
+Opt-in profiling of CPU moves.
+
+Each profiled move runs under cProfile; the per-move stats are merged so the
+report covers every move since profiling started, and the report (hottest
+functions by own time, then by cumulative time, with call counts) is
+rewritten to disk every few moves.
+
+Turn it on with C4_PROFILE=<report file>, e.g.
+C4_PROFILE=profile.txt python game.py
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import time
+from threading import Lock
+
+
+# report file; profiling is on when this is set
+PROFILE_REPORT = os.environ.get("C4_PROFILE")
+# rewrite the report after this many profiled moves
+PROFILE_EVERY = int(os.environ.get("C4_PROFILE_EVERY", 10))
+# functions listed in each section of the report
+PROFILE_TOP = int(os.environ.get("C4_PROFILE_TOP", 30))
+
+
+class MoveProfiler:
+    def __init__(self, report_path: str | None = PROFILE_REPORT, write_every: int = PROFILE_EVERY, top: int = PROFILE_TOP):
+        self.report_path = report_path
+        self.write_every = write_every
+        self.top = top
+        self.moves = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self._stats: pstats.Stats | None = None
+        self._lock = Lock()
+
+    def call(self, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) under cProfile and adds it to the totals."""
+        prof = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return prof.runcall(fn, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(prof)
+                else:
+                    self._stats.add(prof)
+                self.moves += 1
+                self.seconds += elapsed
+                self.slowest = max(self.slowest, elapsed)
+                due = self.report_path and self.write_every > 0 and self.moves % self.write_every == 0
+            if due:
+                self.write_report()
+
+    def report(self) -> str:
+        """Ranked hot-function report over every profiled move so far."""
+        with self._lock:
+            if self._stats is None:
+                return "No moves profiled yet.\n"
+            out = io.StringIO()
+            mean = self.seconds / self.moves
+            out.write(f"{self.moves} moves profiled, {self.seconds:.3f}s total, "
+                      f"{mean:.3f}s mean, {self.slowest:.3f}s slowest\n\n")
+            self._stats.stream = out
+
+            out.write("=== hottest functions (own time) ===\n")
+            self._stats.sort_stats(pstats.SortKey.TIME, pstats.SortKey.CALLS).print_stats(self.top)
+            out.write("=== by cumulative time ===\n")
+            self._stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            return out.getvalue()
+
+    def write_report(self, path: str | None = None) -> None:
+        path = path or self.report_path
+        if not path:
+            return
+        text = self.report()
+        tmp = path + ".tmp"
+        with open(tmp, "w") as fh:
+            fh.write(text)
+        os.replace(tmp, path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = None
+            self.moves = 0
+            self.seconds = 0.0
+            self.slowest = 0.0
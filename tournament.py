@@ -0,0 +1,342 @@
+# tournament.py
+"""
+Self-play tournament between MinMax configurations.
+
+Every pair of configurations plays the same openings twice, once with each
+side moving first, and the games are spread over a process pool. The report
+gives win/draw/loss, the score with a 95% confidence interval, the matching
+Elo difference, and per-move time percentiles for each configuration.
+
+A configuration is a comma separated list of key=value settings:
+  depth=N       search depth (default: MinMax.depth_max)
+  time=S        seconds per move
+  nodes=N       nodes per move
+  book=0|1      use the opening book (default 1)
+  order=NAME    move ordering: center (default), left
+  eval=NAME     evaluation: windows (default), center
+A name can be given in front with a colon, e.g. "fast:depth=6,time=0.2".
+
+Usage:
+  python tournament.py depth=8 depth=6 --games 200
+  python tournament.py "base:depth=8" "cheap:depth=8,eval=center" --openings book --workers 8 --out t.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from itertools import combinations
+from multiprocessing import Pool
+
+from board import ConnectFourBoard
+from CPUAlgorithm import BOOK, MinMax
+
+MOVE_ORDERS = {
+    "center": (3, 2, 4, 1, 5, 0, 6),
+    "left": (0, 1, 2, 3, 4, 5, 6),
+}
+
+
+class CenterEvalMinMax(MinMax):
+    """Cheap evaluation: center column pieces only, no window scan."""
+    CENTER = 0x3F << (3 * 7)
+
+    def evaluate(self, board):
+        return 6 * ((board.cpu_board & self.CENTER).bit_count() - (board.player_board & self.CENTER).bit_count())
+
+
+EVALS = {
+    "windows": MinMax,
+    "center": CenterEvalMinMax,
+}
+
+
+@dataclass
+class Config:
+    name: str
+    depth: int | None = None
+    time_limit: float | None = None
+    node_limit: int | None = None
+    use_book: bool = True
+    order: str = "center"
+    eval: str = "windows"
+
+    @classmethod
+    def parse(cls, spec: str) -> "Config":
+        name, _, settings = spec.rpartition(":")
+        config = cls(name=name or spec)
+        for item in filter(None, settings.split(",")):
+            key, _, value = item.partition("=")
+            if key == "depth":
+                config.depth = int(value)
+            elif key == "time":
+                config.time_limit = float(value)
+            elif key == "nodes":
+                config.node_limit = int(value)
+            elif key == "book":
+                config.use_book = value not in ("0", "false", "no")
+            elif key == "order" and value in MOVE_ORDERS:
+                config.order = value
+            elif key == "eval" and value in EVALS:
+                config.eval = value
+            else:
+                raise ValueError(f"Bad setting '{item}' in '{spec}'")
+        return config
+
+    def engine(self) -> MinMax:
+        ai = EVALS[self.eval]()
+        ai.move_order = MOVE_ORDERS[self.order]
+        return ai
+
+
+# ---------- openings ----------
+def random_openings(count: int, plies: int, rng: random.Random) -> list[str]:
+    """Distinct random move strings of `plies` moves that nobody has won and nobody wins next move."""
+    openings = set()
+    attempts = 0
+    while len(openings) < count and attempts < count * 100:
+        attempts += 1
+        board = ConnectFourBoard()
+        moves = ""
+        for ply in range(plies):
+            col = rng.choice(board.get_valid_moves())
+            board.make_move(col, ply % 2)
+            moves += str(col)
+            if board.check_winner(ply % 2):
+                break
+        else:
+            if not _wins_next(board, plies % 2):
+                openings.add(moves)
+    return sorted(openings)
+
+
+def _wins_next(board: ConnectFourBoard, turn: int) -> bool:
+    for col in board.get_valid_moves():
+        board.make_move(col, turn)
+        won = board.check_winner(turn)
+        board.undo_move()
+        if won:
+            return True
+    return False
+
+
+def book_openings(count: int, plies: int, rng: random.Random) -> list[str]:
+    """
+    Move strings reaching book positions at `plies` that the book scores as
+    a draw, so neither side starts from a theoretically lost game.
+    """
+    wanted = [key for key, (value, _, _) in BOOK.items() if value == 0 and (key[0] | key[1]).bit_count() == plies]
+    if not wanted:
+        raise ValueError(f"The book has no drawn positions at ply {plies}")
+    rng.shuffle(wanted)
+    return [_moves_to(x_board, o_board) for x_board, o_board in wanted[:count]]
+
+
+def _moves_to(x_board: int, o_board: int) -> str:
+    """A move string reaching the position (x to move). Pieces are replayed column by column, bottom up."""
+    plies = (x_board | o_board).bit_count()
+    # x moves next, so x is the first player when an even number of pieces are down
+    first, second = (x_board, o_board) if plies % 2 == 0 else (o_board, x_board)
+    stacks = {0: [], 1: []}
+    for col in range(7):
+        for row in range(6):
+            bit = 1 << (col * 7 + row)
+            if first & bit:
+                stacks[0].append((row, col))
+            elif second & bit:
+                stacks[1].append((row, col))
+    # lower pieces have to go in first; search an interleaving that keeps every drop legal
+    order = _interleave(ConnectFourBoard(), [sorted(stacks[0]), sorted(stacks[1])], 0)
+    if order is None:
+        raise ValueError("Position can't be reached without an earlier win")
+    return "".join(map(str, order))
+
+
+def _interleave(board, pieces, turn):
+    """Column order placing every (row, col) in pieces[0] / pieces[1] with the sides alternating, or None."""
+    if not pieces[0] and not pieces[1]:
+        return []
+    own = pieces[turn]
+    for i, (row, col) in enumerate(own):
+        if board.heights[col] != row:
+            continue
+        board.make_move(col, turn)
+        tail = None
+        if not board.check_winner(turn):
+            rest = list(pieces)
+            rest[turn] = own[:i] + own[i + 1:]
+            tail = _interleave(board, rest, 1 - turn)
+        board.undo_move()
+        if tail is not None:
+            return [col] + tail
+    return None
+
+
+# ---------- games ----------
+_engines = {}
+
+
+def init_worker(configs):
+    global _engines
+    _engines = {config.name: (config, config.engine()) for config in configs}
+
+
+def play_game(args):
+    """Plays one game from `opening`. Returns (first name, second name, opening, result, move times per side)."""
+    first, second, opening = args
+    players = (_engines[first], _engines[second])
+    for _, ai in players:
+        ai.tt.clear()  # games don't lean on each other's TT, so the schedule doesn't matter
+
+    move_times = ([], [])
+    state = ConnectFourBoard.from_moves(opening)
+    turn = state.to_move()
+
+    while True:
+        if not state.get_valid_moves():
+            return first, second, opening, 0.5, move_times
+        config, ai = players[turn]
+        # the engine always plays as its CPU (player 0)
+        mine = state.cpu_board if turn == 0 else state.player_board
+        theirs = state.player_board if turn == 0 else state.cpu_board
+        view = ConnectFourBoard.from_bitboards(mine, theirs)
+        start = time.perf_counter()
+        col, _, _ = ai.search(view, config.depth, config.time_limit, config.node_limit, config.use_book)
+        move_times[turn].append(time.perf_counter() - start)
+
+        state.make_move(col, turn)
+        if state.check_winner(turn):
+            return first, second, opening, 1.0 if turn == 0 else 0.0, move_times
+        turn = 1 - turn
+
+
+# ---------- statistics ----------
+def score_interval(wins: int, draws: int, losses: int, z: float = 1.96):
+    """Score (win=1, draw=0.5) with a normal-approximation confidence interval."""
+    n = wins + draws + losses
+    if n == 0:
+        return 0.5, 0.0, 1.0
+    score = (wins + 0.5 * draws) / n
+    var = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / n
+    margin = z * math.sqrt(var / n)
+    return score, max(0.0, score - margin), min(1.0, score + margin)
+
+
+def elo(score: float) -> float:
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def percentiles(times: list[float]) -> dict:
+    if not times:
+        return {}
+    ordered = sorted(times)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {
+        "moves": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": pct(0.50),
+        "p90": pct(0.90),
+        "p99": pct(0.99),
+        "max": ordered[-1],
+    }
+
+
+def _finite(x):
+    return x if math.isfinite(x) else None
+
+
+def tournament(configs, games_per_pair, openings_kind="random", opening_plies=4, workers=None, seed=1):
+    rng = random.Random(seed)
+    # each opening is played twice (colors swapped), so half as many openings as games
+    count = max(1, games_per_pair // 2)
+    if openings_kind == "book":
+        openings = book_openings(count, opening_plies, rng)
+    else:
+        openings = random_openings(count, opening_plies, rng)
+
+    jobs = []
+    for a, b in combinations(configs, 2):
+        for opening in openings:
+            jobs.append((a.name, b.name, opening))
+            jobs.append((b.name, a.name, opening))
+
+    results = {}
+    times = {config.name: [] for config in configs}
+    start = time.perf_counter()
+    with Pool(workers, initializer=init_worker, initargs=(configs,)) as pool:
+        for done, (first, second, opening, result, move_times) in enumerate(pool.imap_unordered(play_game, jobs), 1):
+            times[first] += move_times[0]
+            times[second] += move_times[1]
+            # tally from the point of view of the pair's first configuration
+            a, b = sorted((first, second), key=[c.name for c in configs].index)
+            wdl = results.setdefault((a, b), [0, 0, 0])
+            a_score = result if first == a else 1 - result
+            wdl[0 if a_score == 1 else 1 if a_score == 0.5 else 2] += 1
+            if done % 50 == 0 or done == len(jobs):
+                print(f"{done}/{len(jobs)} games, {time.perf_counter() - start:.0f}s")
+
+    pairs = []
+    for (a, b), (w, d, l) in results.items():
+        score, lo, hi = score_interval(w, d, l)
+        pairs.append({
+            "a": a, "b": b,
+            "wins": w, "draws": d, "losses": l,
+            "score": score, "score_low": lo, "score_high": hi,
+            "elo": _finite(elo(score)), "elo_low": _finite(elo(lo)), "elo_high": _finite(elo(hi)),
+        })
+    return {
+        "configs": [asdict(c) for c in configs],
+        "openings": {"kind": openings_kind, "plies": opening_plies, "count": len(openings), "seed": seed},
+        "pairs": pairs,
+        "move_times": {name: percentiles(t) for name, t in times.items()},
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def print_report(report):
+    for p in report["pairs"]:
+        elo_text = "n/a" if p["elo"] is None else f"{p['elo']:+.0f}"
+        print(f"{p['a']} vs {p['b']}: +{p['wins']} ={p['draws']} -{p['losses']}  "
+              f"score {p['score']:.3f} [{p['score_low']:.3f}, {p['score_high']:.3f}]  Elo {elo_text}")
+    for name, t in report["move_times"].items():
+        if t:
+            print(f"{name}: {t['moves']} moves, mean {t['mean']:.3f}s, p50 {t['p50']:.3f}s, "
+                  f"p90 {t['p90']:.3f}s, p99 {t['p99']:.3f}s, max {t['max']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play MinMax configurations against each other.")
+    parser.add_argument("configs", nargs="+", help='e.g. "depth=8" "fast:depth=6,time=0.2"')
+    parser.add_argument("--games", type=int, default=100, help="games per pair of configurations")
+    parser.add_argument("--openings", choices=("random", "book"), default="random")
+    parser.add_argument("--opening-plies", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    configs = [Config.parse(spec) for spec in args.configs]
+    if len(configs) < 2:
+        parser.error("need at least two configurations")
+    if len({c.name for c in configs}) != len(configs):
+        parser.error("configuration names must be unique")
+
+    report = tournament(configs, args.games, args.openings, args.opening_plies, args.workers, args.seed)
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()